@@ -1,4 +1,15 @@
-import requests
+"""Check templates and their metadata against a set of best practices.
+
+The template and metadata are walked once. Every node is handed to the
+`visit_<kind>` methods of all rules that have one, and each rule reports as
+many violations as it finds. Line and column numbers are only looked up
+when there is something to report.
+"""
+import json
+import os
+
+from hot.utils import links
+from hot.utils import parsed
 
 RULES = [
     "TemplateLintRequiredSections",
@@ -12,183 +23,458 @@ RULES = [
     "MetadataReachImagesAvailable"
 ]
 
+# Node kinds a rule can visit, for each document, and the section of the
+# document they are found in. `None` is the document itself.
+NODES = {
+    'template': [('template', None),
+                 ('parameter', 'parameters'),
+                 ('parameter_group', 'parameter_groups'),
+                 ('resource', 'resources'),
+                 ('output', 'outputs')],
+    'metadata': [('metadata', None)],
+}
+
+# Bump whenever a rule changes, so cached results of `hot lint --all` from
+# older rules are not reused.
+ENGINE_VERSION = 1
+# Other YAML files containing this are linted as nested templates.
+TEMPLATE_MARKER = 'heat_template_version'
+
+
+class Violation(object):
+    """A rule that failed for one node of a document"""
+
+    def __init__(self, rule, description, document, path, message=None):
+        self.rule = rule
+        self.description = description
+        self.document = document
+        self.path = path
+        self.message = message
+        self.file = None
+        self.line = None
+        self.column = None
+
+    def __repr__(self):
+        return "Violation(rule=%s, path=%s)" % (self.rule, self.path)
+
+    @classmethod
+    def from_dict(cls, values):
+        violation = cls(values['rule'], values['description'], None,
+                        tuple(values['path']), values['message'])
+        violation.file = values['file']
+        violation.line = values['line']
+        violation.column = values['column']
+        return violation
+
+    def to_dict(self):
+        return {'rule': self.rule, 'description': self.description,
+                'message': self.message, 'file': self.file,
+                'path': list(self.path), 'line': self.line,
+                'column': self.column}
+
+    def text(self):
+        location = ':'.join(str(part) for part in
+                            (self.file, self.line, self.column)
+                            if part is not None)
+        text = "%s: %s" % (self.rule, self.description)
+        if self.message:
+            text = "%s %s" % (text, self.message)
+        if location:
+            text = "%s: %s" % (location, text)
+        return text
+
 
 class TemplateLintRule(object):
-    """Base class for template lint rules"""
-    def __init__(self, template, metadata):
-        self.template = template
-        self.metadata = metadata
-        self.custom_message = None
-        self.name = "Unnamed Rule"
-        self.description = "No rule description"
-        self.set_name()
-
-    def set_name(self):
-        """Placeholder for derived class"""
-        pass
-
-    def passes_check(self):
-        """Placeholder for derived class"""
+    """Base class for template lint rules. Derived classes define
+    `visit_<kind>(self, path, value)` methods for the node kinds in `NODES`
+    and call `report` for every problem they find. Rules whose result
+    depends on anything but the document itself set `cacheable` to False.
+    """
+    name = "Unnamed Rule"
+    description = "No rule description"
+    cacheable = True
+
+    def __init__(self):
+        self.violations = []
 
     def __repr__(self):
         return "TemplateLintRule(name=%s, description=%s)" % (
             self.name, self.description)
 
-    def message(self, message):
-        """Set a custom message"""
-        self.custom_message = "%s: %s. %s" % (self.name, self.description,
-                                              message)
-
-    def check(self):
-        """Prints a rule message if the check fails"""
-        if not self.passes_check():
-            if self.custom_message:
-                print(self.custom_message)
-            else:
-                print("%s: %s" % (self.name, self.description))
+    def report(self, document, path, message=None):
+        self.violations.append(Violation(self.name, self.description,
+                                         document, path, message))
 
 
 class TemplateLintRequiredSections(TemplateLintRule):
     """Require sections of a template"""
-    def set_name(self):
-        self.name = "LINT-001"
-        self.description = "`heat_template_version`, `description`, "\
-                           "`parameter_groups`, `parameters`, `resources`, "\
-                           "and `outputs` sections are required."
+    name = "LINT-001"
+    description = "`heat_template_version`, `description`, "\
+                  "`parameter_groups`, `parameters`, `resources`, "\
+                  "and `outputs` sections are required."
 
-    def passes_check(self):
+    def visit_template(self, path, template):
         required_sections = ['heat_template_version', 'description',
                              'parameter_groups', 'parameters', 'resources',
                              'outputs']
-        for section in required_sections:
-            if section not in self.template:
-                return False
-        return True
+        missing = [s for s in required_sections if s not in template]
+        if missing:
+            self.report('template', path, "Missing: %s." % ', '.join(
+                "`%s`" % section for section in missing))
 
 
 class TemplateLintOutputChecks(TemplateLintRule):
     """Verify how all outputs are setup"""
-    def set_name(self):
-        self.name = "LINT-002"
-        self.description = "All outputs should have a `description` and "\
-                           "`value` defined ."
+    name = "LINT-002"
+    description = "All outputs should have a `description` and "\
+                  "`value` defined ."
 
-    def passes_check(self):
+    def visit_output(self, path, values):
         required_keys = ['description', 'value']
-        outputs = self.template['outputs']
-        for output, values in outputs.items():
-            for key in required_keys:
-                if key not in values:
-                    return False
-        return True
+        missing = [key for key in required_keys
+                   if not isinstance(values, dict) or key not in values]
+        if missing:
+            self.report('template', path, "`%s` is missing %s." % (
+                path[-1], ', '.join("`%s`" % key for key in missing)))
 
 
-class TemplateLintParameterLabelCheck(TemplateLintRule):
-    """Verify that all parameters have a label"""
-    def set_name(self):
-        self.name = "LINT-003"
-        self.description = "All parameters should have a defined `label`."
+class ParameterKeyCheck(TemplateLintRule):
+    """Base class for rules that require a key in every parameter"""
+    key = None
 
-    def passes_check(self):
-        parameters = self.template['parameters']
-        for parameter, values in parameters.items():
-            if 'label' not in values:
-                return False
-        return True
+    def visit_parameter(self, path, values):
+        if not isinstance(values, dict) or self.key not in values:
+            self.report('template', path, "`%s` has no `%s`." % (path[-1],
+                                                                 self.key))
 
 
-class TemplateLintParameterDescriptionCheck(TemplateLintRule):
-    """Verify that all parameters have a description"""
-    def set_name(self):
-        self.name = "LINT-004"
-        self.description = "All parameters should have a defined "\
-                           "`description`."
+class TemplateLintParameterLabelCheck(ParameterKeyCheck):
+    """Verify that all parameters have a label"""
+    name = "LINT-003"
+    description = "All parameters should have a defined `label`."
+    key = 'label'
 
-    def passes_check(self):
-        parameters = self.template['parameters']
-        for parameter, values in parameters.items():
-            if 'description' not in values:
-                return False
-        return True
 
+class TemplateLintParameterDescriptionCheck(ParameterKeyCheck):
+    """Verify that all parameters have a description"""
+    name = "LINT-004"
+    description = "All parameters should have a defined "\
+                  "`description`."
+    key = 'description'
 
-class TemplateLintParameterConstraintCheck(TemplateLintRule):
-    """Verify that all parameters have a constraint"""
-    def set_name(self):
-        self.name = "LINT-005"
-        self.description = "All parameters should have defined "\
-                           "`constraints`."
 
-    def passes_check(self):
-        parameters = self.template['parameters']
-        for parameter, values in parameters.items():
-            if 'constraints' not in values:
-                return False
-        return True
+class TemplateLintParameterConstraintCheck(ParameterKeyCheck):
+    """Verify that all parameters have a constraint"""
+    name = "LINT-005"
+    description = "All parameters should have defined "\
+                  "`constraints`."
+    key = 'constraints'
 
 
 class TemplateLintParameterGroupLabelCheck(TemplateLintRule):
     """Verify that all parameter groups have a label"""
-    def set_name(self):
-        self.name = "LINT-006"
-        self.description = "All parameters groups should have a `label`."
+    name = "LINT-006"
+    description = "All parameters groups should have a `label`."
 
-    def passes_check(self):
-        parameter_groups = self.template['parameter_groups']
-        for group in parameter_groups:
-            if 'label' not in group:
-                return False
-        return True
+    def visit_parameter_group(self, path, group):
+        if not isinstance(group, dict) or 'label' not in group:
+            self.report('template', path, "Group %s has no `label`." % (
+                path[-1] + 1))
 
 
 class MetadataRequiredSections(TemplateLintRule):
     """Verify all required metadata sections are present"""
-    def set_name(self):
-        self.name = "LINT-007"
-        self.description = "`schema-version`, `application-family`, "\
-                           "`application-name`, `application-version`, "\
-                           "`flavor`, `flavor-weight`, `reach-info`, "\
-                           "`abstract`, and `instructions` sections are "\
-                           "required in the metadata."
-
-    def passes_check(self):
+    name = "LINT-007"
+    description = "`schema-version`, `application-family`, "\
+                  "`application-name`, `application-version`, "\
+                  "`flavor`, `flavor-weight`, `reach-info`, "\
+                  "`abstract`, and `instructions` sections are "\
+                  "required in the metadata."
+
+    def visit_metadata(self, path, metadata):
         required_sections = ['schema-version', 'application-family',
                              'application-name', 'application-version',
                              'flavor', 'flavor-weight', 'reach-info',
                              'abstract', 'instructions']
-        for section in required_sections:
-            if section not in self.metadata:
-                return False
-        return True
+        missing = [s for s in required_sections if s not in metadata]
+        if missing:
+            self.report('metadata', path, "Missing: %s." % ', '.join(
+                "`%s`" % section for section in missing))
+
+
+REACH_IMAGES = ['tattoo', 'icon-20x20']
+
+
+def reach_info(metadata):
+    """Return the metadata's reach-info section, or an empty one"""
+    info = metadata.get('reach-info')
+    return info if isinstance(info, dict) else {}
 
 
 class MetadataReachImagesDefined(TemplateLintRule):
     """Verify that all reach images exist"""
-    def set_name(self):
-        self.name = "LINT-008"
-        self.description = "`tattoo` and `icon-20x20` images should be "\
-                           "defined."
+    name = "LINT-008"
+    description = "`tattoo` and `icon-20x20` images should be "\
+                  "defined."
 
-    def passes_check(self):
-        images = ['tattoo', 'icon-20x20']
-        for image in images:
-            if image not in self.metadata['reach-info']:
-                return False
-        return True
+    def visit_metadata(self, path, metadata):
+        if 'reach-info' not in metadata:
+            return
+        info = reach_info(metadata)
+        missing = [image for image in REACH_IMAGES if image not in info]
+        if missing:
+            self.report('metadata', path + ('reach-info',),
+                        "Missing: %s." % ', '.join(
+                            "`%s`" % image for image in missing))
 
 
 class MetadataReachImagesAvailable(TemplateLintRule):
     """Verify that all reach images defined are available"""
-    def set_name(self):
-        self.name = "LINT-009"
-        self.description = "`tattoo` and `icon-20x20` images should be "\
-                           "accessible."
-
-    def passes_check(self):
-        images = ['tattoo', 'icon-20x20']
+    name = "LINT-009"
+    description = "`tattoo` and `icon-20x20` images should be "\
+                  "accessible."
+    cacheable = False
+
+    def visit_metadata(self, path, metadata):
+        info = reach_info(metadata)
+        images = [image for image in REACH_IMAGES if image in info]
+        results = links.check([info[image] for image in images
+                               if isinstance(info[image], basestring)])
         for image in images:
-            if image in self.metadata['reach-info']:
-                img = requests.get(self.metadata['reach-info'][image])
-                if not img.ok:
-                    return False
-        return True
+            if isinstance(info[image], basestring):
+                ok, reason = results[info[image]]
+            else:
+                ok, reason = False, "not a URL"
+            if not ok:
+                self.report('metadata', path + ('reach-info', image),
+                            "`%s` is not reachable at %s (%s)." % (
+                                image, info[image], reason))
+
+
+class Linter(object):
+    """Run a set of rules over a template and its metadata in one pass"""
+
+    def __init__(self, rules=None):
+        self.rules = [globals()[name]() for name in (rules or RULES)]
+        self.visitors = {}
+        for kinds in NODES.values():
+            for kind, _ in kinds:
+                self.visitors[kind] = [
+                    getattr(rule, 'visit_' + kind) for rule in self.rules
+                    if hasattr(rule, 'visit_' + kind)]
+
+    def run(self, template, metadata):
+        """Return every violation found in the template and metadata"""
+        return self.check({'template': template, 'metadata': metadata})
+
+    def check(self, documents):
+        """Return every violation found in `documents`, which maps
+        'template' and/or 'metadata' to their data.
+        """
+        for rule in self.rules:
+            rule.violations = []
+        for document, data in documents.items():
+            self.walk(document, data)
+        violations = []
+        for rule in self.rules:
+            violations.extend(rule.violations)
+        return violations
+
+    def walk(self, document, data):
+        if not isinstance(data, dict):
+            data = {}
+        for kind, section in NODES[document]:
+            visitors = self.visitors[kind]
+            if not visitors:
+                continue
+            if section is None:
+                nodes = [((), data)]
+            else:
+                nodes = children(data.get(section), (section,))
+            for path, value in nodes:
+                for visit in visitors:
+                    visit(path, value)
+
+
+def children(node, path):
+    """Return (path, value) pairs for the items of a mapping or list"""
+    if isinstance(node, dict):
+        return [(path + (key,), value) for key, value in node.items()]
+    if isinstance(node, list):
+        return [(path + (index,), value) for index, value in enumerate(node)]
+    return []
+
+
+def positions(content):
+    """Map the path of every node in a YAML document to its line and
+    column. Mapping entries point at their key.
+    """
+    import yaml
+    from hot.utils.yaml import SafeLoader
+    found = {}
+    root = yaml.compose(content, Loader=SafeLoader)
+    if root is None:
+        return found
+    stack = [((), root, root.start_mark)]
+    while stack:
+        path, node, mark = stack.pop()
+        found[path] = (mark.line + 1, mark.column + 1)
+        if isinstance(node, yaml.MappingNode):
+            for key, value in node.value:
+                if isinstance(key, yaml.ScalarNode):
+                    stack.append((path + (key.value,), value,
+                                  key.start_mark))
+        elif isinstance(node, yaml.SequenceNode):
+            for index, value in enumerate(node.value):
+                stack.append((path + (unicode(index),), value,
+                              value.start_mark))
+    return found
+
+
+def locate(violations, files):
+    """Fill in the file, line and column of violations and sort them by
+    position. `files` maps each document to the path of its file.
+    """
+    found = {}
+    for violation in violations:
+        path = files.get(violation.document)
+        violation.file = path
+        if path is None:
+            continue
+        if path not in found:
+            try:
+                with open(path) as handle:
+                    found[path] = positions(handle.read())
+            except Exception:
+                found[path] = {}
+        place(violation, found[path])
+    violations.sort(key=lambda v: (v.file, v.line, v.column, v.rule))
+
+
+def place(violation, found):
+    """Set the line and column of a violation from `positions` output"""
+    parts = tuple(unicode(part) for part in violation.path)
+    # Missing nodes are reported at the closest parent that exists
+    while parts and parts not in found:
+        parts = parts[:-1]
+    violation.line, violation.column = found.get(parts, (None, None))
+
+
+def format_violations(violations, output_format='text'):
+    """Return the violations as text, one per line, or as JSON"""
+    if output_format == 'json':
+        return json.dumps([violation.to_dict() for violation in violations],
+                          indent=2, sort_keys=True)
+    return '\n'.join(violation.text() for violation in violations)
+
+
+def discover(roots, template='.catalog', metadata='rackspace.yaml'):
+    """Find everything to lint below `roots`. Returns a sorted list of
+    (template, metadata) paths. Directories with a `template` file pair it
+    with their `metadata` file, if any. Other YAML files that look like Heat
+    templates are linted as nested templates without metadata.
+    """
+    jobs = set()
+    for root in roots:
+        for directory, dirs, files in os.walk(root):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in files:
+                path = os.path.normpath(os.path.join(directory, name))
+                if name == template:
+                    metadata_path = os.path.normpath(
+                        os.path.join(directory, metadata))
+                    if not os.path.isfile(metadata_path):
+                        metadata_path = None
+                    jobs.add((path, metadata_path))
+                elif name != metadata and \
+                        name.endswith(('.yaml', '.yml', '.template')):
+                    try:
+                        with open(path) as handle:
+                            nested = TEMPLATE_MARKER in handle.read()
+                    except IOError:
+                        nested = False
+                    if nested:
+                        jobs.add((path, None))
+    return sorted(jobs)
+
+
+def parse_yaml(content):
+    import yaml
+    from hot.utils.yaml import SafeLoader
+    return yaml.load(content, Loader=SafeLoader)
+
+
+def check_content(document, content, rules):
+    """Lint the content of a file and return the violations as dicts
+    without a file name, so the result can be cached by content.
+    """
+    import yaml
+    try:
+        data = parse_yaml(content)
+    except yaml.YAMLError as exc:
+        violation = Violation('LINT-000', 'File must be valid YAML.',
+                              document, (),
+                              getattr(exc, 'problem', None) or str(exc))
+        mark = getattr(exc, 'problem_mark', None)
+        if mark:
+            violation.line, violation.column = mark.line + 1, mark.column + 1
+        return [violation.to_dict()]
+    violations = Linter(rules).check({document: data})
+    if violations:
+        found = positions(content)
+        for violation in violations:
+            place(violation, found)
+    return [violation.to_dict() for violation in violations]
+
+
+def lint_file(document, path):
+    """Lint one template or metadata file. Results of cacheable rules are
+    cached by the file's content and ENGINE_VERSION.
+    """
+    cacheable = [name for name in RULES if globals()[name].cacheable]
+    others = [name for name in RULES if not globals()[name].cacheable]
+    try:
+        results = parsed.load_file(
+            path, lambda content: check_content(document, content, cacheable),
+            'lint-%s-%s' % (document, ENGINE_VERSION))
+        if others and not any(r['rule'] == 'LINT-000' for r in results):
+            data = parsed.load_file(path, parse_yaml, 'yaml')
+            violations = Linter(others).check({document: data})
+            locate(violations, {document: path})
+            results = results + [v.to_dict() for v in violations]
+    except (IOError, OSError) as exc:
+        results = [Violation('LINT-000', 'File must be readable.', document,
+                             (), str(exc)).to_dict()]
+    violations = [Violation.from_dict(values) for values in results]
+    for violation in violations:
+        violation.file = path
+    return violations
+
+
+def lint_job(job):
+    """Lint a (template, metadata) pair found by `discover`"""
+    template, metadata = job
+    violations = lint_file('template', template)
+    if metadata:
+        violations.extend(lint_file('metadata', metadata))
+    return [violation.to_dict() for violation in violations]
+
+
+def lint_all(jobs, processes=None):
+    """Lint all (template, metadata) pairs across a pool of processes and
+    return the combined violations.
+    """
+    if processes == 1 or len(jobs) < 2:
+        results = [lint_job(job) for job in jobs]
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(processes, initializer=parsed.reset)
+        try:
+            results = pool.map(lint_job, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    violations = [Violation.from_dict(values)
+                  for result in results for values in result]
+    violations.sort(key=lambda v: (v.file, v.line, v.column, v.rule))
+    return violations
@@ -1,32 +1,51 @@
 """ hot is the command-line tool for testing Heat Templates """
 import collections
+import hashlib
+import json
 import os
 import re
-import signal
 import sys
-import yaml
+import threading
 
 from argh import arg, ArghParser
-from heatclient.common import utils
-from heatclient.v1 import Client as heatClient
 from time import sleep, time
-from retrying import retry
 try:
     from urllib.parse import urlparse
 except ImportError:
     from urlparse import urlparse
 
-import hot.lint
-import hot.tests
-import hot.utils
-import hot.utils.auth
-from hot.utils.yaml import OrderedDictYAMLLoader as OrderedDictYAMLLoader
+# Only modules that are cheap to import belong here. Anything that pulls in
+# the OpenStack clients, fabric/paramiko or GitPython is imported by the
+# subcommand that needs it, so `hot docs` and `hot lint` start quickly.
+import hot.utils.cleanup
+import hot.utils.executor
+import hot.utils.files
+import hot.utils.parsed
+import hot.utils.poll
+import hot.utils.repo
+import hot.utils.report
+import hot.utils.results
+import hot.utils.shard
+import hot.utils.ssh
+import hot.utils.string
+import hot.utils.timeline
+import hot.utils.timeout
+import hot.utils.yaml
 
 
 ENV_VARS = ['OS_PASSWORD', 'OS_USERNAME', 'OS_TENANT_ID', 'OS_AUTH_URL']
 
 DOC_SECTIONS = ['parameters', 'outputs']
 
+RESULTS_FILE = '.hot/results.db'
+
+TIMINGS_FILE = '.hot/timings.json'
+
+# fabric keeps its settings in a global env, resource tests use paths relative
+# to their repo and several of them share files on disk, so resource tests are
+# run one at a time even when stacks are provisioned concurrently.
+RESOURCE_TEST_LOCK = threading.Lock()
+
 
 def verify_environment_vars(variables):
     for variable in variables:
@@ -61,10 +80,8 @@ def docs(**kwargs):
     path_to_metadata = os.path.join(verified_template_directory,
                                     metadata_attr)
     try:
-        raw_template = get_raw_yaml_file(file_path=path_to_template)
-        validated_template = yaml.load(raw_template, OrderedDictYAMLLoader)
-        raw_metadata = get_raw_yaml_file(file_path=path_to_metadata)
-        validated_metadata = yaml.load(raw_metadata, OrderedDictYAMLLoader)
+        validated_template = load_yaml_file(path_to_template, ordered=True)
+        validated_metadata = load_yaml_file(path_to_metadata, ordered=True)
     except StandardError as exc:
         sys.exit(exc)
     # Set necessary variables for CI badges based on rackspace.yaml information
@@ -195,47 +212,65 @@ def init(project, **kwargs):
 
 @arg('--template', default='.catalog', help='Heat template to launch.')
 @arg('--metadata', default='rackspace.yaml', help='Metadata file to audit')
+@arg('--format', default='text', choices=['text', 'json'],
+     help='Report violations as text or JSON.')
+@arg('--all', default=False, help='Lint every template and metadata file '
+                                  'found below the given paths.')
+@arg('--paths', nargs='*', type=str, default=['.'],
+     help='Directories or repos to search with --all.')
+@arg('-j', '--jobs', type=int, default=None, help='Number of processes used '
+                                                  'by --all. Defaults to the '
+                                                  'number of CPUs.')
 def lint(**kwargs):
     """Check a template against a set of best practices"""
-    verified_template_directory = hot.utils.repo.check(kwargs['template'])
+    import hot.lint
     template = kwargs['template']
     metadata = kwargs['metadata']
 
-    path_to_template = os.path.join(verified_template_directory, template)
-    path_to_metadata = os.path.join(verified_template_directory, metadata)
-
-    try:
-        raw_template = get_raw_yaml_file(file_path=path_to_template)
-        validated_template = hot.utils.yaml.load(raw_template)
-        raw_metadata = get_raw_yaml_file(file_path=path_to_metadata)
-        validated_metadata = hot.utils.yaml.load(raw_metadata)
-
-    except StandardError as exc:
-        sys.exit(exc)
-
-    for rule_object_name in hot.lint.RULES:
-        rule = getattr(hot.lint, rule_object_name)(validated_template,
-                                                   validated_metadata)
-        rule.check()
-
-
-def tests_subset_ci(tests):
+    if kwargs['all']:
+        jobs = hot.lint.discover(kwargs['paths'], template, metadata)
+    else:
+        hot.utils.repo.check(template)
+        jobs = [(template, metadata)]
+    violations = hot.lint.lint_all(jobs, kwargs['jobs'])
+
+    if violations or kwargs['format'] == 'json':
+        print(hot.lint.format_violations(violations, kwargs['format']))
+    if kwargs['all'] and kwargs['format'] == 'text':
+        files = set(path for job in jobs for path in job if path)
+        failed = set(violation.file for violation in violations)
+        print("%s violations in %s of %s files." % (len(violations),
+                                                    len(failed), len(files)))
+    if violations:
+        sys.exit(1)
+
+
+def tests_subset_ci(tests, durations=None):
+    """Return the test cases this CI node should run. Cases are split by
+    their recorded `durations` so all nodes finish at about the same time,
+    or round-robin if there are none.
+    """
     if 'CIRCLE_NODE_TOTAL' in os.environ and \
        'CIRCLE_NODE_INDEX' in os.environ:
-        increment = 0
         node_total = int(os.environ.get('CIRCLE_NODE_TOTAL'))
         node_index = int(os.environ.get('CIRCLE_NODE_INDEX'))
-        tests_to_run = []
-        for case in tests:
-            if (increment % node_total) == node_index:
-                tests_to_run.append(case)
-            increment += 1
+        durations = durations or {}
+        names = [test.get('name') for test in tests]
+        shards = hot.utils.shard.shard(names, durations, node_total)
+        selected = set(shards[node_index])
+        tests_to_run = [test for test in tests
+                        if test.get('name') in selected]
+        estimates = [sum(durations.get(name, 0) for name in node_names)
+                     for node_names in shards]
         print "selecting {}/{} tests for node {}/{}. Running:\n{}\n".format(
             len(tests_to_run),
             len(tests),
             node_index,
             node_total,
             "\n".join([test.get('name') for test in tests_to_run]))
+        if any(estimates):
+            print("Estimated minutes per node: %s\n" % ', '.join(
+                "%.1f" % (seconds / 60) for seconds in estimates))
         return tests_to_run
     else:
         return tests
@@ -245,8 +280,9 @@ def tests_subset_ci(tests):
 @arg('--tests-file', default='tests.yaml', help='Test file to use.')
 @arg('-k', '--keep-failed', default=False, help='Do not delete a failed test '
                                                 'deployment.')
-@arg('-s', '--sleep', default=15, type=int, help='Frequency for checking test '
-                                                 'stack status.')
+@arg('-s', '--sleep', default=15, type=int, help='Maximum time in seconds '
+                                                 'between test stack status '
+                                                 'checks.')
 @arg('--test-cases', nargs='+', type=str, help='Space delimited list of '
                                                'tests to run. If none are '
                                                'specified, all will be run.')
@@ -259,7 +295,23 @@ def tests_subset_ci(tests):
      'strictly validate SSL certificates.')
 @arg('--ci-parallel', default=False, help='Parallelize using CI provider '
      'methods. CircleCI is supported using the '
-     'CIRCLE_NODE_TOTAL & CIRCLE_NODE_INDEX environment variables.')
+     'CIRCLE_NODE_TOTAL & CIRCLE_NODE_INDEX environment variables. Test '
+     'cases are split by their durations recorded in %s.' % TIMINGS_FILE)
+@arg('--concurrency', default=1, type=int, help='Number of test cases to run '
+     'at the same time.')
+@arg('--reuse-stacks', default=False, help='Build one stack for test cases '
+     'that use the same create parameters and run all of their resource '
+     'tests against it.')
+@arg('--update-stacks', default=False, help='Build one stack per concurrent '
+     'run and move it from test case to test case with stack updates '
+     'instead of building a new stack for each.')
+@arg('--incremental', default=False, help='Skip test cases that passed before '
+     'and have not changed since. Results are kept in %s.' % RESULTS_FILE)
+@arg('--force', default=False, help='With --incremental, run test cases even '
+     'if they passed before.')
+@arg('--report-dir', help='Directory to write the run report to, as %s '
+     'and %s. Defaults to $CIRCLE_ARTIFACTS.' % (
+         hot.utils.report.REPORT_FILE, hot.utils.report.JUNIT_FILE))
 def test(**kwargs):
     """ Test a template by going through the test scenarios in 'tests.yaml' or
     the tests file specified by the user
@@ -273,27 +325,23 @@ def test(**kwargs):
     parameter_overrides = kwargs['parameters']
     insecure = kwargs['insecure']
     parallelize_ci = kwargs['ci_parallel']
+    concurrency = kwargs['concurrency']
+    reuse_stacks = kwargs['reuse_stacks']
+    update_stacks = kwargs['update_stacks']
+    incremental = kwargs['incremental']
+    force = kwargs['force']
+    hot.utils.report.start()
 
     path_to_template = os.path.join(verified_template_directory, template_attr)
     path_to_tests = os.path.join(verified_template_directory, tests_attr)
     try:
         verify_environment_vars(ENV_VARS)
-        raw_template = get_raw_yaml_file(file_path=path_to_template)
-        validated_template = hot.utils.yaml.load(raw_template)
-        raw_tests = get_raw_yaml_file(file_path=path_to_tests)
-        validated_tests = hot.utils.yaml.load(raw_tests)
+        validated_template = load_yaml_file(path_to_template)
+        validated_tests = load_yaml_file(path_to_tests)
         tests = update_dict_env(validated_tests['test-cases'])
     except StandardError as exc:
         sys.exit(exc)
 
-    auth = hot.utils.auth.OSAuth()
-
-    if insecure:
-        hc = heatClient(endpoint=auth.get_heat_url(), token=auth.get_token(),
-                        insecure=True)
-    else:
-        hc = heatClient(endpoint=auth.get_heat_url(), token=auth.get_token())
-
     if test_cases:
         user_tests = []
         for case in test_cases:
@@ -306,27 +354,478 @@ def test(**kwargs):
                      "found: %s" % user_defined_tests)
         tests = user_tests
 
+    timings = hot.utils.shard.Timings(
+        os.path.join(verified_template_directory, TIMINGS_FILE))
     if parallelize_ci:
-        tests = tests_subset_ci(tests)
+        tests = tests_subset_ci(tests, timings.durations)
+
+    results = None
+    if incremental:
+        results = hot.utils.results.ResultCache(
+            os.path.join(verified_template_directory, RESULTS_FILE))
+        keys = dict((test['name'], case_fingerprint(
+            validated_template, parameter_overrides, test,
+            verified_template_directory)) for test in tests)
+        if not force:
+            tests = skip_passed_tests(tests, keys, results)
+            if not tests:
+                print("All test cases passed before and are unchanged.")
+                return
+
+    def record_passed(chain, seconds):
+        """Remember a chain that passed and split its time evenly between
+        its test cases. Failed chains often stop early, so their time would
+        skew the estimates.
+        """
+        names = [test['name'] for group in chain for test in group]
+        for name in names:
+            if results:
+                results.record(keys[name], name)
+            timings.record(name, seconds / len(names))
+
+    hc = get_heat_client(insecure)
+
+    if reuse_stacks:
+        groups = group_test_cases(validated_template, parameter_overrides,
+                                  tests)
+    else:
+        groups = [[test] for test in tests]
 
+    if update_stacks:
+        chains = chain_test_groups(parameter_overrides, groups, concurrency)
+    else:
+        chains = [[group] for group in groups]
+
+    reaper = hot.utils.cleanup.StackReaper(hc, sleeper)
+    try:
+        if concurrency > 1 and len(chains) > 1:
+            run_test_cases_concurrently(hc, validated_template,
+                                        parameter_overrides, chains,
+                                        keep_failed, sleeper, concurrency,
+                                        reaper, record_passed)
+        else:
+            for chain in chains:
+                start = time()
+                run_test_chain(hc, validated_template, parameter_overrides,
+                               chain, keep_failed, sleeper, reaper=reaper)
+                record_passed(chain, time() - start)
+    finally:
+        timings.save()
+        leftovers = finish_cleanup(reaper)
+        write_report(kwargs['report_dir'])
+    if leftovers:
+        sys.exit("%s stacks could not be deleted." % len(leftovers))
+
+
+@arg('repos', nargs='*', help='Template repo directories to test.')
+@arg('--manifest', help='YAML file with a list of template repo directories, '
+     'relative to the manifest.')
+@arg('--template', default='.catalog', help='Heat template to launch in each '
+                                            'repo.')
+@arg('--tests-file', default='tests.yaml', help='Test file to use in each '
+                                                'repo.')
+@arg('-k', '--keep-failed', default=False, help='Do not delete a failed test '
+                                                'deployment.')
+@arg('-s', '--sleep', default=15, type=int, help='Maximum time in seconds '
+                                                 'between test stack status '
+                                                 'checks.')
+@arg('--insecure', default=False, help='Same as to -k flag with curl, do not '
+     'strictly validate SSL certificates.')
+@arg('--concurrency', default=4, type=int, help='Number of test stacks to run '
+     'at the same time across all repos.')
+@arg('--reuse-stacks', default=False, help='Build one stack for test cases '
+     'that use the same create parameters and run all of their resource '
+     'tests against it.')
+@arg('--update-stacks', default=False, help='Move one stack from test case '
+     'to test case with stack updates instead of building a new stack for '
+     'each.')
+@arg('--report-dir', help='Directory to write the run report to, as %s '
+     'and %s. Defaults to $CIRCLE_ARTIFACTS.' % (
+         hot.utils.report.REPORT_FILE, hot.utils.report.JUNIT_FILE))
+def fleet(repos, **kwargs):
+    """Test several template repos in one run. All of their test cases share
+    one heat client and one limit on the number of test stacks in flight.
+    """
+    repos = list(repos)
+    if kwargs['manifest']:
+        repos.extend(read_manifest(kwargs['manifest']))
+    if not repos:
+        sys.exit("No template repos given.")
+    sleeper = kwargs['sleep']
+    keep_failed = kwargs['keep_failed']
+    concurrency = kwargs['concurrency']
+    hot.utils.report.start()
+
+    work = []
+    try:
+        verify_environment_vars(ENV_VARS)
+        for repo in repos:
+            directory = os.path.abspath(repo)
+            template = load_yaml_file(os.path.join(directory,
+                                                   kwargs['template']))
+            tests = load_yaml_file(os.path.join(directory,
+                                                kwargs['tests_file']))
+            tests = update_dict_env(tests['test-cases'])
+            if kwargs['reuse_stacks']:
+                groups = group_test_cases(template, None, tests)
+            else:
+                groups = [[test] for test in tests]
+            if kwargs['update_stacks']:
+                chains = chain_test_groups(None, groups)
+            else:
+                chains = [[group] for group in groups]
+            work.extend((os.path.relpath(directory), directory, template,
+                         chain)
+                        for chain in chains)
+    except StandardError as exc:
+        sys.exit(exc)
+
+    print("Running %s test stacks from %s repos, %s at a time." % (
+        len(work), len(repos), concurrency))
+    hc = get_heat_client(kwargs['insecure'])
+    poller = hot.utils.poll.StackPoller(hc, sleeper)
+    reaper = hot.utils.cleanup.StackReaper(hc, sleeper)
+
+    def pipeline(item):
+        _, directory, template, chain = item
+        run_test_chain(hc, template, None, chain, keep_failed, sleeper,
+                       poller, reaper, directory)
+
+    def name(item):
+        return "%s: %s" % (item[0], chain_name(item[3]))
+
+    try:
+        results = hot.utils.executor.run(pipeline, work, concurrency, name)
+        failed = report_results(results)
+        print("\nRepos:")
+        for repo in sorted(set(item[0] for item in work)):
+            repo_results = [result for item, result in zip(work, results)
+                            if item[0] == repo]
+            print("  %s: %s of %s test stacks passed" % (
+                repo, len([r for r in repo_results if r.passed]),
+                len(repo_results)))
+    finally:
+        leftovers = finish_cleanup(reaper)
+        write_report(kwargs['report_dir'])
+    if failed:
+        sys.exit("%s of %s test stacks failed." % (len(failed), len(results)))
+    if leftovers:
+        sys.exit("%s stacks could not be deleted." % len(leftovers))
+
+
+@arg('stack_id', help='ID of the stack to report on.')
+@arg('--template', help='Template the stack was built from. Defaults to the '
+     'template heat has for the stack.')
+@arg('--action', default='CREATE', choices=['CREATE', 'UPDATE'],
+     help='Stack action to report on.')
+@arg('--insecure', default=False, help='Same as to -k flag with curl, do not '
+     'strictly validate SSL certificates.')
+def timeline(stack_id, **kwargs):
+    """Show how long each resource of a stack took to provision, the
+    critical path through the template's dependencies and the slowest
+    resources.
+    """
+    try:
+        verify_environment_vars(ENV_VARS)
+        template = None
+        if kwargs['template']:
+            template = load_yaml_file(kwargs['template'])
+    except StandardError as exc:
+        sys.exit(exc)
+    hc = get_heat_client(kwargs['insecure'])
+    if not print_timeline(hc, stack_id, template, kwargs['action']):
+        sys.exit(1)
+
+
+def print_timeline(hc, stack_id, template=None, action='CREATE'):
+    """Print which resources decided how long `action` took on a stack.
+    Returns False if the stack's events could not be fetched.
+    """
+    try:
+        if template is None:
+            template = hc.stacks.template(stack_id)
+        events = list(hc.events.list(stack_id))
+    except Exception as exc:
+        print("  Unable to fetch the events of %s: %s" % (stack_id, exc))
+        return False
+    lines = hot.utils.timeline.summary(events, template, action)
+    # One print, so concurrent test stacks do not interleave their lines
+    print("\n".join(["  Timeline of %s:" % stack_id] +
+                    ["    " + line for line in lines]))
+    return True
+
+
+def read_manifest(path):
+    """Return the repo directories listed in a fleet manifest. The manifest
+    is a YAML list of directories, or a mapping with a `repos` list.
+    """
+    try:
+        manifest = load_yaml_file(path)
+    except StandardError as exc:
+        sys.exit(exc)
+    if isinstance(manifest, dict):
+        manifest = manifest.get('repos')
+    if not isinstance(manifest, list):
+        sys.exit("%s must contain a list of template repos." % path)
+    base = os.path.dirname(os.path.abspath(path))
+    return [os.path.join(base, str(repo)) for repo in manifest]
+
+
+def write_report(report_dir=None):
+    """Write the run report to `report_dir`, or to $CIRCLE_ARTIFACTS. Never
+    raises, so a broken report cannot hide the result of the run.
+    """
+    report_dir = report_dir or os.environ.get('CIRCLE_ARTIFACTS')
+    if not report_dir:
+        return
+    try:
+        paths = hot.utils.report.write(report_dir)
+    except Exception as exc:
+        print("Unable to write run report to %s: %s" % (report_dir, exc))
+        return
+    print("Wrote run report to %s and %s" % paths)
+
+
+def get_heat_client(insecure=False):
+    """Authenticate and return a heat client whose token is kept fresh"""
+    import hot.utils.auth
+    import hot.utils.http
+    with hot.utils.report.phase('auth'):
+        auth = hot.utils.auth.OSAuth()
+        hc = hot.utils.http.heat_client(auth.get_heat_url(), auth.get_token(),
+                                        insecure)
+    auth.keep_token_fresh(hc.http_client.auth)
+    return hc
+
+
+def skip_passed_tests(tests, keys, results):
+    """Drop test cases whose recorded result for the same key is a pass"""
+    to_run = []
+    for test in tests:
+        if results.passed(keys[test['name']]):
+            print("Skipping %s, it passed before and has not changed." %
+                  test['name'])
+        else:
+            to_run.append(test)
+    return to_run
+
+
+def referenced_files(test, directory):
+    """Return the local fabfiles and script files a test case uses"""
+    paths = set()
+    resource_tests = test.get('resource_tests') or {}
+    for resource_test in resource_tests.get('tests') or []:
+        for settings in resource_test.values():
+            fabric_env = (settings.get('fabric') or {}).get('env') or {}
+            paths.add(fabric_env.get('fabfile'))
+            for cmd in (settings.get('script') or {}).get('commands') or []:
+                if isinstance(cmd.get('command'), basestring):
+                    paths.update(cmd['command'].split())
+                paths.update(arg for arg in cmd.get('command_args') or []
+                             if isinstance(arg, basestring))
+    return sorted(path for path in paths if isinstance(path, basestring) and
+                  os.path.isfile(os.path.join(directory, path)))
+
+
+def case_fingerprint(template, overrides, test, directory):
+    """Hash of the stack inputs, the test case definition and the contents of
+    the files it uses.
+    """
+    files = {}
+    for path in referenced_files(test, directory):
+        with open(os.path.join(directory, path), 'rb') as handle:
+            files[path] = hashlib.sha1(handle.read()).hexdigest()
+    inputs = {'stack': stack_fingerprint(template, overrides, test),
+              'test': test,
+              'files': files}
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True,
+                                   default=str)).hexdigest()
+
+
+def stack_fingerprint(template, overrides, test):
+    """Hash of everything that goes into creating a test case's stack"""
+    inputs = {'template': template,
+              'parameters': get_stack_parameters(test, overrides) or {}}
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True,
+                                   default=str)).hexdigest()
+
+
+def group_test_cases(template, overrides, tests):
+    """Group test cases that would create identical stacks, keeping the order
+    in which each group first appears.
+    """
+    groups = collections.OrderedDict()
     for test in tests:
-        stack = launch_test_deployment(hc, validated_template,
-                                       parameter_overrides, test, keep_failed,
-                                       sleeper)
+        fingerprint = stack_fingerprint(template, overrides, test)
+        groups.setdefault(fingerprint, []).append(test)
+    for group in groups.values():
+        if len(group) > 1:
+            print("Sharing one stack between: %s" % group_name(group))
+    return groups.values()
+
+
+def group_name(group):
+    return ", ".join([test['name'] for test in group])
+
+
+def chain_name(chain):
+    return " -> ".join([group_name(group) for group in chain])
+
+
+def parameter_diff(first, second):
+    """Number of parameters that differ between two parameter dicts"""
+    keys = set(first) | set(second)
+    return len([key for key in keys if first.get(key) != second.get(key)])
+
+
+def chain_test_groups(overrides, groups, concurrency=1):
+    """Order groups of test cases so that each one differs from the previous
+    one in as few parameters as possible, then split them into up to
+    `concurrency` chains. Each chain is run on a single stack that is
+    updated from one group to the next.
+    """
+    remaining = list(groups)
+    ordered = [remaining.pop(0)]
+    while remaining:
+        last = get_stack_parameters(ordered[-1][0], overrides) or {}
+        nearest = min(remaining, key=lambda group: parameter_diff(
+            last, get_stack_parameters(group[0], overrides) or {}))
+        remaining.remove(nearest)
+        ordered.append(nearest)
+    count = max(1, min(concurrency, len(ordered)))
+    bounds = [len(ordered) * i // count for i in range(count + 1)]
+    chains = [ordered[bounds[i]:bounds[i + 1]] for i in range(count)]
+    for chain in chains:
+        if len(chain) > 1:
+            print("Updating one stack through: %s" % chain_name(chain))
+    return chains
+
+
+def finish_cleanup(reaper):
+    """Wait for background stack deletions and report any stacks that are
+    still around.
+    """
+    hot.utils.ssh.close_all()
+    with hot.utils.report.phase('cleanup'):
+        leftovers = reaper.finish()
+    if leftovers:
+        print("The following stacks could not be deleted and are still using "
+              "quota:")
+        for stack_id, reason in sorted(leftovers.items()):
+            print("  %s: %s" % (stack_id, reason))
+    return leftovers
+
+
+def run_test_chain(hc, template, overrides, chain, keep_failed, sleeper,
+                   poller=None, reaper=None, directory=None):
+    """Create a stack for the first group of test cases in `chain`, run the
+    group's resource tests, then update the stack to each following group's
+    parameters in turn and run that group's resource tests. The first test
+    case of each group provides the create settings. Exits if the stack fails
+    to build or update, or if a resource test fails. Resource tests run in
+    `directory` if given. The chain is recorded as one case of the run
+    report.
+    """
+    suite = os.path.basename(directory) if directory else 'hot'
+    with hot.utils.report.case(chain_name(chain), suite):
+        _run_test_chain(hc, template, overrides, chain, keep_failed, sleeper,
+                        poller, reaper, directory)
+
+
+def _run_test_chain(hc, template, overrides, chain, keep_failed, sleeper,
+                    poller, reaper, directory):
+    stack = launch_test_deployment(hc, template, overrides, chain[0][0],
+                                   keep_failed, sleeper, poller, reaper,
+                                   directory)
+    print_timeline(hc, stack['stack']['id'], template)
+    failures = []
+    for index, group in enumerate(chain):
+        if index:
+            try:
+                update_test_deployment(hc, stack, template, overrides,
+                                       group[0], sleeper, poller)
+            except Exception as exc:
+                failures.append("Stack failed to update for %s: %s" % (
+                    group_name(group), exc))
+                break
+        failures.extend(run_group_resource_tests(hc, stack, group,
+                                                 directory))
+    if failures:
+        delete_test_deployment(hc, stack, keep_failed, reaper)
+        sys.exit("Test Failed! %s" % "; ".join(failures))
+    delete_test_deployment(hc, stack, reaper=reaper)
+
+
+def run_group_resource_tests(hc, stack, group, directory=None):
+    """Run the resource tests of every test case in `group` against `stack`
+    and return a list of failures.
+    """
+    failures = []
+    for test in group:
         if 'resource_tests' in test:
+            if len(group) > 1:
+                print("  Running resource tests for %s" % test['name'])
             try:
-                run_resource_tests(hc, stack['stack']['id'],
-                                   test)
+                run_resource_tests(hc, stack['stack']['id'], test, directory)
                 print("  Test Passed!")
             except:
                 exctype, value = sys.exc_info()[:2]
-                delete_test_deployment(hc, stack, keep_failed)
-                sys.exit("Test Failed! %s: %s" %
-                         (exctype, value))
-        delete_test_deployment(hc, stack)
+                print("  Test %s failed: %s: %s" % (test['name'],
+                                                    exctype, value))
+                failures.append("%s: %s" % (exctype, value))
+    return failures
+
+
+def run_test_cases_concurrently(hc, template, overrides, chains, keep_failed,
+                                sleeper, concurrency, reaper=None,
+                                on_pass=None):
+    """Run up to `concurrency` chains of test cases at once and exit with a
+    failure if any of them failed. `on_pass` is called with each chain that
+    passes and the seconds it took.
+    """
+    print("Running %s test stacks, %s at a time." % (len(chains),
+                                                     concurrency))
+    poller = hot.utils.poll.StackPoller(hc, sleeper)
+
+    def pipeline(chain):
+        start = time()
+        run_test_chain(hc, template, overrides, chain, keep_failed,
+                       sleeper, poller, reaper)
+        if on_pass:
+            on_pass(chain, time() - start)
+
+    results = hot.utils.executor.run(pipeline, chains, concurrency,
+                                     name=chain_name)
+    failed = report_results(results)
+    if failed:
+        sys.exit("%s of %s test stacks failed." % (len(failed), len(results)))
+
+
+def report_results(results):
+    """Print whether each test stack passed and return the failed ones"""
+    print("\nResults:")
+    for result in results:
+        if result.passed:
+            print("  PASSED: %s" % result.name)
+        else:
+            print("  FAILED: %s (%s)" % (result.name, result.error))
+    return [result for result in results if not result.passed]
 
 
-def run_resource_tests(hc, stack_id, resource_tests):
+def run_resource_tests(hc, stack_id, resource_tests, directory=None):
+    """Run a test case's resource tests, in `directory` if given"""
+    with RESOURCE_TEST_LOCK, hot.utils.report.phase('resource_tests'), \
+            hot.utils.ssh.using(stack_id):
+        if directory:
+            with hot.utils.files.working_directory(directory):
+                _run_resource_tests(hc, stack_id, resource_tests)
+        else:
+            _run_resource_tests(hc, stack_id, resource_tests)
+
+
+def _run_resource_tests(hc, stack_id, resource_tests):
+    import hot.tests.fab
+    import hot.tests.script
     stack_info = hc.stacks.get(stack_id)
     outputs = stack_info.to_dict().get('outputs', [])
     # Sub out {get_output: value} lines
@@ -443,16 +942,31 @@ def get_env(key):
                        (key))
 
 
-def delete_test_deployment(hc, stack, keep_deployment=False):
+def delete_test_deployment(hc, stack, keep_deployment=False, reaper=None):
+    """Delete a test stack. With a `reaper` the deletion happens in the
+    background and is verified before hot exits. SSH connections to the
+    stack's servers are closed either way.
+    """
+    hot.utils.ssh.close(stack['stack']['id'])
     if keep_deployment:
         print("  Keeping %s up." % stack['stack']['id'])
-    else:
+        return
+    if reaper:
+        # The case's delete phase is added once the stack is really gone
+        record = hot.utils.report.current_case()
+        print("  Deleting %s in the background" % stack['stack']['id'])
+        reaper.delete(stack['stack']['id'],
+                      lambda seconds: hot.utils.report.add_phase(
+                          'delete', seconds, record))
+        return
+    with hot.utils.report.phase('delete'):
         print("  Deleting %s" % stack['stack']['id'])
         hc.stacks.delete(stack['stack']['id'])
 
 
 def launch_test_deployment(hc, template, overrides, test, keep_failed,
-                           sleeper):
+                           sleeper, poller=None, reaper=None, directory=None):
+    from retrying import retry
     retries = get_create_value(test, 'retries')
     if (retries is None):
         retries = 3
@@ -467,43 +981,39 @@ def launch_test_deployment(hc, template, overrides, test, keep_failed,
                 return True
         return False
 
+    # Serialize once rather than on every attempt
+    template_yaml = hot.utils.yaml.dump(template)
+
     @retry(stop_max_attempt_number=retries, retry_on_exception=retry_on_error,
            wrap_exception=True)
-    def deploy(hc, template, overrides, test, keep_failed, sleeper):
+    def deploy(hc, template, overrides, test, keep_failed, sleeper, poller,
+               reaper):
         pattern = re.compile('[\W]')
         stack_name = pattern.sub('_', "%s-%s" % (test['name'], time()))
-        data = {"stack_name": stack_name, "template": yaml.safe_dump(template)}
+        data = {"stack_name": stack_name, "template": template_yaml}
 
         timeout = get_create_value(test, 'timeout')
-        parameters = get_create_value(test, 'parameters')
-
-        if overrides:
-            if parameters:
-                parameters = dict(parameters.items() +
-                                  utils.format_parameters(overrides).items())
-            else:
-                parameters = utils.format_parameters(overrides)
+        parameters = get_stack_parameters(test, overrides)
 
         # retries = get_create_value(test, 'retries') # TODO: Implement retries
 
+        deadline = hot.utils.timeout.Deadline(timeout and timeout * 60)
         if timeout:
             data["timeout_mins"] = timeout
-            timeout_value = timeout * 60
-            signal.signal(signal.SIGALRM, hot.utils.timeout.handler)
-            signal.alarm(timeout_value)
         if parameters:
             data.update({"parameters": parameters})
 
         print("Launching: %s" % stack_name)
-        stack = hc.stacks.create(**data)
+        with hot.utils.report.phase('create_request'):
+            stack = hc.stacks.create(**data)
 
-        if timeout_value:
-            print("  Timeout set to %s seconds." % timeout_value)
+        if timeout:
+            print("  Timeout set to %s seconds." % deadline.seconds)
 
         try:
-            monitor_stack(hc, stack['stack']['id'], sleeper)
-            if timeout_value:
-                signal.alarm(0)
+            with hot.utils.report.phase('create_in_progress'):
+                monitor_stack(hc, stack['stack']['id'], sleeper, poller,
+                              deadline)
         except Exception as exc:
             print exc
             if "Script exited with code 1" not in str(exc):
@@ -511,15 +1021,56 @@ def launch_test_deployment(hc, template, overrides, test, keep_failed,
             else:
                 print("Automation scripts failed. Running tests anyway:")
                 try:
-                    run_resource_tests(hc, stack['stack']['id'], test)
+                    run_resource_tests(hc, stack['stack']['id'], test,
+                                       directory)
                     print("  Test Passed!")
                 except:
                     exctype, value = sys.exc_info()[:2]
                     print("Test Failed! {0}: {1}".format(exctype, value))
-            delete_test_deployment(hc, stack, keep_failed)
+            delete_test_deployment(hc, stack, keep_failed, reaper)
             sys.exit("Stack failed to deploy")
         return stack
-    return deploy(hc, template, overrides, test, keep_failed, sleeper)
+    return deploy(hc, template, overrides, test, keep_failed, sleeper,
+                  poller, reaper)
+
+
+def update_test_deployment(hc, stack, template, overrides, test, sleeper,
+                           poller=None):
+    """Update a test stack to a test case's create parameters and wait for
+    the update to finish.
+    """
+    stack_id = stack['stack']['id']
+    data = {"template": hot.utils.yaml.dump(template)}
+    timeout = get_create_value(test, 'timeout')
+    parameters = get_stack_parameters(test, overrides)
+    deadline = hot.utils.timeout.Deadline(timeout and timeout * 60)
+    if timeout:
+        data["timeout_mins"] = timeout
+    if parameters:
+        data.update({"parameters": parameters})
+
+    print("Updating: %s for %s" % (stack_id, test['name']))
+    with hot.utils.report.phase('update_request'):
+        updated_time = getattr(hc.stacks.get(stack_id), 'updated_time', None)
+        hc.stacks.update(stack_id, **data)
+    with hot.utils.report.phase('update_in_progress'):
+        monitor_stack(hc, stack_id, sleeper, poller, deadline,
+                      action='UPDATE', updated_time=updated_time)
+
+
+def get_stack_parameters(test, overrides):
+    """Return the test case's create parameters with any overrides from the
+    command line applied.
+    """
+    from heatclient.common import utils
+    parameters = get_create_value(test, 'parameters')
+    if overrides:
+        if parameters:
+            parameters = dict(parameters.items() +
+                              utils.format_parameters(overrides).items())
+        else:
+            parameters = utils.format_parameters(overrides)
+    return parameters
 
 
 def get_create_value(test, key):
@@ -528,22 +1079,56 @@ def get_create_value(test, key):
     return None
 
 
-def monitor_stack(hc, stack_id, sleeper=15):
-    incomplete = True
-    while incomplete:
-        print("  Stack %s in progress, checking in %s seconds.." % (stack_id,
-                                                                    sleeper))
-        sleep(sleeper)
+def monitor_stack(hc, stack_id, sleeper=15, poller=None, deadline=None,
+                  action='CREATE', updated_time=None):
+    """Wait for a stack to finish `action`. Polls quickly at first, backs off
+    towards `sleeper` seconds and tightens up again once most of the stack's
+    resources are complete. If a shared `poller` is given, it checks on the
+    stack along with every other stack in flight instead. Raises if the stack
+    is not done by its `deadline`. For updates, `updated_time` is the stack's
+    before the update request, so the previous update's final state is not
+    mistaken for this one's.
+    """
+    deadline = deadline or hot.utils.timeout.Deadline()
+    if poller:
+        print("  Stack %s in progress, waiting for it to finish.." % stack_id)
+        status = poller.watch(stack_id, deadline, action,
+                              updated_time).wait()
+        return check_stack_status(stack_id, status, action)
+    backoff = hot.utils.poll.Backoff(cap=sleeper)
+    tracker = hot.utils.poll.ActionTracker(action, updated_time)
+    while True:
+        interval = min(backoff.next(), deadline.remaining())
+        print("  Stack %s in progress, checking in %.3g seconds.." % (
+            stack_id, interval))
+        sleep(interval)
         status = hc.stacks.get(stack_id)
-        if status.stack_status == u'CREATE_COMPLETE':
-            incomplete = False
-            print("  Stack %s built successfully!" % stack_id)
-        elif status.stack_status == u'CREATE_FAILED':
-            stack_status = status.stack_status_reason
-            print("  Stack %s build failed! Reason:\n  %s" % (stack_id,
-                                                              stack_status))
-            raise Exception("Stack build {0} failed! Reason: {1}".format(
-                stack_id, stack_status))
+        if tracker.done(status):
+            return check_stack_status(stack_id, status, action)
+        deadline.check()
+        if backoff.should_probe():
+            progress = hot.utils.poll.stack_progress(hc, stack_id)
+            if progress >= hot.utils.poll.NEAR_DONE:
+                print("  Stack %s is %d%% complete." % (stack_id,
+                                                        progress * 100))
+                backoff.tighten()
+
+
+def check_stack_status(stack_id, status, action='CREATE'):
+    """Return the status of a finished stack, raise if `action` failed"""
+    if action == 'CREATE':
+        done, verb = "built", "build"
+    else:
+        done, verb = "%sd" % action.lower(), action.lower()
+    if hot.utils.poll.is_success(status.stack_status, action):
+        print("  Stack %s %s successfully!" % (stack_id, done))
+        return status
+    stack_status = "%s: %s" % (status.stack_status,
+                               status.stack_status_reason)
+    print("  Stack %s %s failed! Reason:\n  %s" % (stack_id, verb,
+                                                   stack_status))
+    raise Exception("Stack {0} {1} failed! Reason: {2}".format(
+        verb, stack_id, stack_status))
 
 
 def get_raw_yaml_file(file_path=None):
@@ -574,6 +1159,25 @@ def get_raw_yaml_file(file_path=None):
     return file_contents
 
 
+def load_yaml_file(file_path, ordered=False):
+    """Parse a YAML file in the repository. The parsed result is cached, so
+    a file that has not changed since an earlier run is not parsed again.
+    """
+    if urlparse(file_path).scheme != '':
+        return hot.utils.yaml.load(get_raw_yaml_file(file_path),
+                                   ordered=ordered)
+
+    def parse(content):
+        return hot.utils.yaml.load(content, ordered=ordered)
+
+    variant = 'yaml-ordered' if ordered else 'yaml'
+    try:
+        return hot.utils.parsed.load_file(os.path.expanduser(file_path), parse,
+                                          variant)
+    except (IOError, OSError) as ioerror:
+        raise IOError('Error reading %s. [%s]' % (file_path, ioerror))
+
+
 def main():
     """Shell entry point for execution"""
     try:
@@ -583,6 +1187,8 @@ def main():
             docs,
             init,
             lint,
+            fleet,
+            timeline,
         ])
 
         argparser.dispatch()
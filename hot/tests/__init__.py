@@ -1,7 +1,8 @@
-"""Various testing functions for templates"""
+"""Various testing functions for templates
 
-import fab
-import script
+Submodules are imported by the code that runs them, so loading this package
+does not pull in fabric.
+"""
 
 __all__ = ["fab",
            "script"]
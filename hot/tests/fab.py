@@ -1,23 +1,101 @@
-import fabric
+import hashlib
 import imp
 import os
+import sys
+import threading
 
-from fabric.api import env
+import fabric.tasks
+
+from fabric.api import env, settings
+
+from hot.utils import output
+from hot.utils import ssh
+
+# Loaded fabfiles, keyed by path and content hash, so a fabfile used by many
+# test cases is only compiled once and an edited one is loaded again.
+_fabfiles = {}
+_lock = threading.Lock()
+
+# Task attributes fabric reads to decide where and how to run a task.
+TASK_ATTRIBUTES = ('hosts', 'roles', 'exclude_hosts', 'parallel', 'serial',
+                   'pool_size')
+
+# Keys of a test's fabric settings that tell hot what to run rather than
+# configure fabric.
+HOT_KEYS = ('fabfile', 'tasks')
+
+
+def load_fabfile(path):
+    """Return the fabfile at `path` as a module, from the cache when its
+    content has not changed.
+    """
+    path = os.path.abspath(path)
+    with open(path) as handle:
+        source = handle.read()
+    key = (path, hashlib.sha1(source).hexdigest())
+    with _lock:
+        if key not in _fabfiles:
+            name = os.path.splitext(os.path.basename(path))[0]
+            module = imp.new_module(name)
+            module.__file__ = path
+            exec(compile(source, path, 'exec'), module.__dict__)
+            _fabfiles[key] = module
+        return _fabfiles[key]
+
+
+def fork_safe():
+    """False while test stacks run concurrently. Their threads print through
+    a shared PrefixedStream, and a process forked by fabric's parallel mode
+    while its lock is held would hang on its first print.
+    """
+    return not isinstance(sys.stdout, output.PrefixedStream)
+
+
+def managed(task, connections, serial=False):
+    """Wrap a task so it runs on each host through `connections`, one host
+    after the other if `serial` is set
+    """
+    def run_task(*args, **kwargs):
+        with connections.channel():
+            return task(*args, **kwargs)
+    run_task.__name__ = run_task.name = getattr(task, 'name', task.__name__)
+    for name in TASK_ATTRIBUTES:
+        if hasattr(task, name):
+            setattr(run_task, name, getattr(task, name))
+    if serial:
+        run_task.parallel = False
+        run_task.serial = True
+    return run_task
 
 
 def run_fabric_tasks(test_name, test):
-    """Setup fabric environment and run fabric script"""
+    """Setup fabric environment and run fabric script.
+
+    The settings only apply while the test runs. With `parallel: True` each
+    task runs on all hosts at once, at most `pool_size` at a time, unless
+    test stacks run concurrently. SSH connections are shared with the other
+    resource tests of the stack.
+    """
     env_setup = test['fabric']
     if env_setup['env']:
         fab_file = env_setup['env']['fabfile']
         print("  Preparing environtment to run fabric tests:")
+        test_env = {}
         for k, v in env_setup['env'].iteritems():
             print("    Setting env['%s'] to %s" % (k, v))
-            env[k] = v
-        mod_name = os.path.splitext(os.path.basename(fab_file))[0]
-        mod = imp.load_source(mod_name, fab_file)
-        for task in env_setup['env']['tasks']:
-            print("  Run fabric test '%s', task '%s' on: %s" % (test_name,
-                                                                task,
-                                                                env.hosts))
-            fabric.tasks.execute(getattr(mod, task))
+            if k not in HOT_KEYS:
+                test_env[k] = v
+        mod = load_fabfile(fab_file)
+        connections = ssh.current()
+        serial = not fork_safe()
+        if serial:
+            if test_env.get('parallel'):
+                print("  Running tasks on one host after the other, fabric's "
+                      "parallel mode cannot be used with --concurrency.")
+            test_env['parallel'] = False
+        with settings(**test_env):
+            for task in env_setup['env']['tasks']:
+                print("  Run fabric test '%s', task '%s' on: %s" % (
+                    test_name, task, env.hosts))
+                fabric.tasks.execute(managed(getattr(mod, task),
+                                             connections, serial))
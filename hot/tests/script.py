@@ -1,53 +1,244 @@
+import collections
 import os
+import signal
 import subprocess
+import threading
+import time
 
+from contextlib import contextmanager
+
+from hot.utils import executor
 from hot.utils import files
 from hot.utils import hosts
+from hot.utils import output
+from hot.utils import report
 from hot.utils import string
 
+# Seconds a command may run before it and every process it started are
+# killed. No limit by default; set `timeout` on the script test or on a
+# single command to set one.
+COMMAND_TIMEOUT = None
+# Seconds between asking a timed out command to stop and killing it.
+KILL_GRACE = 5
+# Lines of output kept per command for the run report, and the length each
+# line is cut to.
+OUTPUT_LINES = 200
+LINE_LENGTH = 1000
 
-def run_script(test_name, test):
-    """Setup environment and run a script"""
-    script_setup = test['script']
-    if "hosts" in script_setup:
-        if os.name == 'nt':
-            hosts_path = os.path.join(os.environ['SYSTEMROOT'],
-                                      'system32/drivers/etc/hosts')
-        elif os.name == 'posix':
-            hosts_path = '/etc/hosts'
-        h = hosts.Hosts(hosts_path)
-        for entry in script_setup['hosts']:
+
+class CommandFailed(Exception):
+    pass
+
+
+def to_text(value):
+    """Return `value` as unicode, replacing bytes that are not UTF-8, so
+    command output can always be written to the run report
+    """
+    if isinstance(value, unicode):
+        return value
+    return str(value).decode('utf-8', 'replace')
+
+
+class CommandResult(object):
+    """Exit status and the last lines of output of one command"""
+
+    def __init__(self, command):
+        self.command = command
+        self.returncode = None
+        self.seconds = None
+        self.timed_out = False
+        self.error = None
+        self.lines = collections.deque(maxlen=OUTPUT_LINES)
+        self.line_count = 0
+
+    def failure(self):
+        if self.error:
+            return "'%s' could not start: %s" % (self.command, self.error)
+        if self.timed_out:
+            return "'%s' timed out after %.0f seconds" % (self.command,
+                                                          self.seconds)
+        if self.returncode:
+            return "'%s' exited with %s" % (self.command, self.returncode)
+
+    def to_dict(self):
+        return {'command': to_text(self.command),
+                'returncode': self.returncode, 'seconds': self.seconds,
+                'timed_out': self.timed_out,
+                'error': self.error and to_text(self.error),
+                'dropped_lines': self.line_count - len(self.lines),
+                'output': [{'time': offset, 'stream': stream, 'line': line}
+                           for offset, stream, line in self.lines]}
+
+
+def build_command(cmd):
+    """Return a command entry of a script test as an argument list"""
+    command = cmd["command"]
+    if "command_args" in cmd:
+        args = cmd['command_args']
+        command = " ".join((command, string.list_to_string(args)))
+    return string.string_to_list(command)
+
+
+def kill_group(process):
+    """Stop a command and everything it started, forcefully if it does not
+    exit within KILL_GRACE seconds
+    """
+    if os.name != 'posix':
+        process.kill()
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        for _ in range(KILL_GRACE * 10):
+            if process.poll() is not None:
+                return
+            time.sleep(0.1)
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def run_command(cmd_list, timeout=COMMAND_TIMEOUT):
+    """Run a command in its own process group, printing its output as it
+    comes and keeping the last lines of it. The whole group is killed once
+    `timeout` seconds have passed.
+    """
+    result = CommandResult(" ".join(cmd_list))
+    start = time.time()
+    options = {}
+    if os.name == 'posix':
+        options['preexec_fn'] = os.setsid
+    try:
+        process = subprocess.Popen(cmd_list, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, **options)
+    except OSError as exc:
+        result.error = str(exc)
+        result.seconds = time.time() - start
+        return result
+    prefix = output.get_prefix()
+    lock = threading.Lock()
+
+    def capture(stream, name):
+        output.set_prefix(prefix)
+        for line in iter(stream.readline, ''):
+            line = line.rstrip('\n')
+            # Decode before cutting, so a character is never split
+            text = to_text(line)[:LINE_LENGTH]
+            with lock:
+                result.lines.append((round(time.time() - start, 3), name,
+                                     text))
+                result.line_count += 1
+            print("    %s" % line)
+        stream.close()
+
+    readers = [threading.Thread(target=capture, args=(process.stdout,
+                                                      'stdout')),
+               threading.Thread(target=capture, args=(process.stderr,
+                                                      'stderr'))]
+    for reader in readers:
+        reader.daemon = True
+        reader.start()
+
+    def expire():
+        result.timed_out = True
+        kill_group(process)
+
+    timer = threading.Timer(timeout, expire) if timeout else None
+    try:
+        if timer:
+            timer.daemon = True
+            timer.start()
+        result.returncode = process.wait()
+    finally:
+        if timer:
+            timer.cancel()
+        if process.poll() is None:
+            kill_group(process)
+    for reader in readers:
+        # Processes that left the group may still hold the pipes open
+        reader.join(KILL_GRACE)
+    result.seconds = time.time() - start
+    return result
+
+
+def run_commands(commands, timeout=COMMAND_TIMEOUT, parallel=False):
+    """Run the commands of a script test, one after the other or all at
+    once, record them in the run report and raise if any of them failed.
+    One after the other, the first failure stops the rest.
+    """
+    def run(cmd):
+        return run_command(build_command(cmd), cmd.get('timeout', timeout))
+
+    failures = []
+    if parallel:
+        outcomes = executor.run(run, commands, len(commands),
+                                lambda cmd: cmd['command'])
+        results = [outcome.value for outcome in outcomes if outcome.passed]
+        failures.extend("'%s' did not run: %s" % (outcome.name, outcome.error)
+                        for outcome in outcomes if not outcome.passed)
+    else:
+        results = []
+        for cmd in commands:
+            results.append(run(cmd))
+            if results[-1].failure():
+                break
+    for result in results:
+        report.command(result.to_dict())
+    failures = [result.failure() for result in results
+                if result.failure()] + failures
+    if failures:
+        raise CommandFailed("; ".join(failures))
+
+
+def hosts_path():
+    if os.name == 'nt':
+        return os.path.join(os.environ['SYSTEMROOT'],
+                            'system32/drivers/etc/hosts')
+    return '/etc/hosts'
+
+
+@contextmanager
+def host_entries(entries):
+    """Add a script test's hosts file entries in one write while the block
+    runs, and remove them again afterwards
+    """
+    if not entries:
+        yield
+        return
+    with hosts.Transaction(hosts_path()) as transaction:
+        for entry in entries:
             if "ip" in entry:
                 ip = entry["ip"]
                 if "hostnames" in entry:
                     for hostname in entry['hostnames']:
                         print("  Setting host entry '%s\t%s'" % (ip, hostname))
                         if isinstance(hostname, str):
-                            h.set_one(hostname, ip)
+                            transaction.set_one(hostname, ip)
                         elif isinstance(hostname, list):
-                            h.set_all(hostname, ip)
+                            transaction.set_all(hostname, ip)
             else:
                 raise TypeError
-        h.write(hosts_path)
-
-    # Write Files
-    if "files" in script_setup:
-        for file, value in files:
-            files.write_file(file, value)
-
-    # Set Environment Variables
-    if "environment" in script_setup:
-        for k, v in script_setup["environment"]:
-            os.environ[k] = str(v)
-
-    # Run commands
-    if "commands" in script_setup:
-        # TODO: Run scripts
-        for cmd in script_setup["commands"]:
-            if "command" in cmd:
-                command = cmd["command"]
-                if "command_args" in cmd:
-                    args = cmd['command_args']
-                    command = " ".join((command, string.list_to_string(args)))
-                cmd_list = string.string_to_list(command)
-                subprocess.check_call(cmd_list)
+        transaction.commit()
+        yield
+
+
+def run_script(test_name, test):
+    """Setup environment and run a script"""
+    script_setup = test['script']
+    with host_entries(script_setup.get("hosts")):
+        # Write Files
+        if "files" in script_setup:
+            for file, value in files:
+                files.write_file(file, value)
+
+        # Set Environment Variables
+        if "environment" in script_setup:
+            for k, v in script_setup["environment"]:
+                os.environ[k] = str(v)
+
+        # Run commands
+        if "commands" in script_setup:
+            commands = [cmd for cmd in script_setup["commands"]
+                        if "command" in cmd]
+            run_commands(commands,
+                         script_setup.get('timeout', COMMAND_TIMEOUT),
+                         script_setup.get('parallel', False))
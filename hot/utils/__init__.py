@@ -1,18 +1,25 @@
-"""Misc utilities that can be used across the project"""
+"""Misc utilities that can be used across the project
 
-import files
-import hosts
-import repo
-import test
-import timeout
-import token
-import string
-import yaml
+Submodules are not imported here, since some of them pull in heavy
+dependencies. Import the ones you need, e.g. `import hot.utils.poll`.
+"""
 
-__all__ = ["files",
+__all__ = ["cleanup",
+           "executor",
+           "files",
            "hosts",
+           "http",
+           "links",
+           "output",
+           "parsed",
+           "poll",
            "repo",
+           "report",
+           "results",
+           "shard",
+           "ssh",
            "test",
+           "timeline",
            "timeout",
            "token",
            "string",
@@ -1,17 +1,41 @@
 
+import calendar
+import hashlib
+import json
 import os
+import threading
+import time
 import keystoneclient.v2_0.client as ksclient
 
+from hot.utils import files
+from hot.utils import http
+from hot.utils import poll
+
+# Tokens, their expiry and the resolved heat endpoints are cached here so
+# repeated runs can skip authentication. Set HOT_AUTH_CACHE to another path,
+# or to an empty string to disable the cache.
+AUTH_CACHE = '~/.hot/auth.json'
+# Authenticate again when the token expires within this many seconds.
+EXPIRY_MARGIN = 300
+# Longest wait, in seconds, between attempts to refresh a token after failed
+# ones, e.g. while keystone is down.
+REFRESH_RETRY_CAP = 60
+
 
 class OSAuth(object):
 
     def __init__(self):
         self.creds = self.get_keystone_creds()
-        self.keystone_client = ksclient.Client(**self.creds)
+        self.cache_path = os.path.expanduser(
+            os.environ.get('HOT_AUTH_CACHE', AUTH_CACHE))
+        self.cache_key = self.get_cache_key()
+        self.lock = threading.RLock()
+        self.keystone_client = None
+        self.entry = self.load_cache()
+        if not self.entry:
+            self.authenticate()
         if not self.creds.get('region_name'):
-            sc = self.keystone_client.service_catalog.catalog
-            self.creds['region_name'] = \
-                sc['user'].get('RAX-AUTH:defaultRegion')
+            self.creds['region_name'] = self.entry.get('region')
 
     def get_keystone_creds(self):
         creds = {}
@@ -28,15 +52,116 @@ class OSAuth(object):
                 creds['region_name'] = creds['region_name'].upper()
         return creds
 
+    def get_cache_key(self):
+        """Identify the credentials without storing any secret"""
+        parts = [self.creds.get('auth_url'), self.creds.get('username'),
+                 self.creds.get('tenant_id'), self.creds.get('region_name'),
+                 self.creds.get('token')]
+        return hashlib.sha1('\n'.join(str(part) for part in parts)) \
+            .hexdigest()
+
+    def authenticate(self):
+        """Authenticate against keystone and cache the new token"""
+        with self.lock:
+            creds = dict(self.creds)
+            if not creds.get('region_name'):
+                creds.pop('region_name', None)
+            self.keystone_client = ksclient.Client(
+                session=http.keystone_session(), **creds)
+            self.keystone_client.authenticate()
+            auth_ref = self.keystone_client.auth_ref
+            sc = self.keystone_client.service_catalog.catalog
+            self.entry = {
+                'token': self.keystone_client.auth_token,
+                'expires': calendar.timegm(auth_ref.expires.utctimetuple()),
+                'region': self.creds.get('region_name') or
+                sc['user'].get('RAX-AUTH:defaultRegion'),
+                'endpoints': {},
+            }
+            self.save_cache()
+
+    def expires_in(self):
+        """Seconds until the current token expires"""
+        return self.entry['expires'] - time.time()
+
     def get_token(self):
-        return self.keystone_client.auth_token
+        with self.lock:
+            if self.expires_in() < EXPIRY_MARGIN:
+                self.authenticate()
+            return self.entry['token']
 
     def get_heat_url(self):
         if os.environ.get('HEAT_URL'):
             return os.environ.get('HEAT_URL')
-        else:
+        with self.lock:
             region = self.creds.get('region_name')
-            heat_url = self.keystone_client.service_catalog.url_for(
-                service_type='orchestration',
-                endpoint_type='publicURL', region_name=region)
+            heat_url = self.entry['endpoints'].get(str(region))
+            if not heat_url:
+                if self.keystone_client is None:
+                    self.authenticate()
+                heat_url = self.keystone_client.service_catalog.url_for(
+                    service_type='orchestration',
+                    endpoint_type='publicURL', region_name=region)
+                self.entry['endpoints'][str(region)] = heat_url
+                self.save_cache()
             return heat_url
+
+    def keep_token_fresh(self, token_auth, sleep=time.sleep):
+        """Re-authenticate in the background shortly before the token expires
+        and hand the new token to the `token_auth` plugin of a client, so long
+        runs do not fail part-way through. Failed attempts are retried with
+        backoff up to REFRESH_RETRY_CAP seconds apart. Only possible when
+        authenticating with a password.
+        """
+        if self.creds.get('token'):
+            return
+
+        def refresh():
+            backoff = None
+            while True:
+                if backoff:
+                    sleep(backoff.next())
+                else:
+                    sleep(max(self.expires_in() - EXPIRY_MARGIN, 1))
+                try:
+                    token_auth.token = self.get_token()
+                    backoff = None
+                except Exception as exc:
+                    print("  Unable to refresh auth token: %s" % exc)
+                    backoff = backoff or poll.Backoff(cap=REFRESH_RETRY_CAP)
+
+        thread = threading.Thread(target=refresh)
+        thread.daemon = True
+        thread.start()
+
+    def load_cache(self):
+        """Return the cached entry for these credentials if still valid"""
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path) as handle:
+                entry = json.load(handle).get(self.cache_key)
+        except (IOError, ValueError):
+            return None
+        if entry and entry['expires'] - time.time() > EXPIRY_MARGIN:
+            return entry
+        return None
+
+    def save_cache(self):
+        """Write the entry to the cache file, readable only by the user"""
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path) as handle:
+                cache = json.load(handle)
+        except (IOError, ValueError):
+            cache = {}
+        now = time.time()
+        cache = dict((key, value) for key, value in cache.items()
+                     if value.get('expires', 0) > now)
+        cache[self.cache_key] = self.entry
+        try:
+            files.write_private(self.cache_path, json.dumps(cache))
+        except (IOError, OSError) as exc:
+            print("Unable to cache auth token in %s: %s" % (
+                self.cache_path, exc))
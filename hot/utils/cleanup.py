@@ -0,0 +1,148 @@
+"""Delete stacks in the background and verify that they are really gone"""
+import Queue
+import threading
+import time
+
+from hot.utils import poll
+from hot.utils import timeout
+
+DELETE_WORKERS = 4
+DELETE_RETRIES = 3
+MAX_RETRY_DELAY = 300
+# Seconds one delete attempt may take before the stack is left behind.
+DELETE_TIMEOUT = 30 * 60
+
+
+class StackReaper(object):
+    """Hand stack deletions to a pool of background workers. Each worker
+    deletes a stack, waits for DELETE_COMPLETE and retries failed deletes
+    and errors talking to heat with backoff. A stack still not gone once an
+    attempt's `delete_timeout` passes is left behind. `finish` blocks until
+    everything handed over is gone or has been given up on. The seconds
+    each stack took to reach DELETE_COMPLETE are kept in `durations`.
+    """
+
+    def __init__(self, hc, sleeper=15, workers=DELETE_WORKERS,
+                 retries=DELETE_RETRIES, delete_timeout=DELETE_TIMEOUT):
+        self.hc = hc
+        self.sleeper = sleeper
+        self.workers = workers
+        self.retries = retries
+        self.delete_timeout = delete_timeout
+        self.queue = Queue.Queue()
+        self.reaping = set()
+        self.failed = {}
+        self.durations = {}
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def delete(self, stack_id, deleted=None):
+        """Queue a stack for deletion and return immediately. `deleted` is
+        called with the seconds the deletion took once the stack is gone.
+        """
+        with self.lock:
+            if not self.threads:
+                for _ in range(self.workers):
+                    thread = threading.Thread(target=self.work)
+                    thread.daemon = True
+                    thread.start()
+                    self.threads.append(thread)
+            self.reaping.add(stack_id)
+        self.queue.put((stack_id, deleted))
+
+    def work(self):
+        while True:
+            stack_id, deleted = self.queue.get()
+            try:
+                start = time.time()
+                if self.reap(stack_id):
+                    seconds = time.time() - start
+                    with self.lock:
+                        self.durations[stack_id] = seconds
+                    if deleted:
+                        deleted(seconds)
+            except Exception as exc:
+                with self.lock:
+                    self.failed[stack_id] = str(exc)
+            finally:
+                with self.lock:
+                    self.reaping.discard(stack_id)
+                self.queue.task_done()
+
+    def reap(self, stack_id):
+        """Delete a stack, retrying until it is gone or retries run out.
+        Returns True once it is gone.
+        """
+        reason = None
+        for attempt in range(1, self.retries + 1):
+            deadline = timeout.Deadline(self.delete_timeout)
+            try:
+                try:
+                    self.hc.stacks.delete(stack_id)
+                except Exception as exc:
+                    if not is_not_found(exc):
+                        raise
+                status, reason = self.wait_for_delete(stack_id, deadline)
+            except Exception as exc:
+                status, reason = None, str(exc)
+            if status == 'DELETE_COMPLETE':
+                return True
+            if deadline.expired():
+                reason = "Not deleted within %s seconds" % self.delete_timeout
+                print("  Giving up on deleting %s: %s" % (stack_id, reason))
+                break
+            print("  Deleting %s failed (attempt %s of %s): %s" % (
+                stack_id, attempt, self.retries, reason))
+            if attempt < self.retries:
+                time.sleep(min(self.sleeper * 2 ** attempt, MAX_RETRY_DELAY))
+        with self.lock:
+            self.failed[stack_id] = reason
+
+    def wait_for_delete(self, stack_id, deadline=None):
+        """Return the final delete status and reason of a stack, or no status
+        if it is still being deleted when `deadline` passes
+        """
+        deadline = deadline or timeout.Deadline()
+        backoff = poll.Backoff(cap=self.sleeper)
+        while not deadline.expired():
+            time.sleep(min(backoff.next(), deadline.remaining()))
+            try:
+                status = self.hc.stacks.get(stack_id)
+            except Exception as exc:
+                if is_not_found(exc):
+                    return 'DELETE_COMPLETE', None
+                raise
+            # Right after the request the stack may still show its previous
+            # state, so only DELETE_* states count.
+            if status.stack_status.startswith('DELETE_') and \
+               poll.is_terminal(status.stack_status):
+                return status.stack_status, status.stack_status_reason
+        return None, None
+
+    def pending(self):
+        """Number of deletions that have not finished yet"""
+        return self.queue.unfinished_tasks
+
+    def finish(self, seconds=None):
+        """Block until all queued deletions are done, for at most `seconds`,
+        by default as long as every attempt of a deletion may take. Returns a
+        dict of the stacks that could not be deleted and why.
+        """
+        if seconds is None:
+            seconds = self.retries * (self.delete_timeout + MAX_RETRY_DELAY)
+        deadline = timeout.Deadline(seconds)
+        if self.pending():
+            print("Waiting for %s stack deletions to finish.." %
+                  self.pending())
+        while self.pending() and not deadline.expired():
+            time.sleep(min(1, deadline.remaining()))
+        with self.lock:
+            failed = dict(self.failed)
+            for stack_id in self.reaping:
+                failed.setdefault(stack_id, "Still being deleted")
+            return failed
+
+
+def is_not_found(exc):
+    """True if heat says the stack does not exist"""
+    return getattr(exc, 'code', None) == 404
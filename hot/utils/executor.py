@@ -0,0 +1,68 @@
+"""Run work items concurrently with a bounded number of threads"""
+import Queue
+import sys
+import threading
+
+from hot.utils import output
+
+
+class Result(object):
+    """Outcome of running one work item"""
+
+    def __init__(self, name):
+        self.name = name
+        self.passed = False
+        self.value = None
+        self.error = None
+
+    def __repr__(self):
+        return "Result(name=%s, passed=%s, error=%s)" % (self.name,
+                                                         self.passed,
+                                                         self.error)
+
+
+def run(func, items, concurrency=1, name=str):
+    """Call `func` on every item, with at most `concurrency` calls in flight.
+
+    Output printed by each call is prefixed with `[<name(item)>]`, after the
+    caller's own prefix when run from inside another `run`. A call
+    passes unless it raises; `sys.exit` is treated as a failure with the exit
+    message as the reason. Returns a list of `Result` in the order of `items`.
+    """
+    results = [Result(name(item)) for item in items]
+    outer = output.get_prefix()
+    work = Queue.Queue()
+    for index, item in enumerate(items):
+        work.put((index, item))
+
+    def worker():
+        while True:
+            try:
+                index, item = work.get_nowait()
+            except Queue.Empty:
+                return
+            result = results[index]
+            output.set_prefix("%s[%s] " % (outer, result.name))
+            try:
+                result.value = func(item)
+                result.passed = True
+            except SystemExit as exc:
+                result.error = exc.code
+            except Exception:
+                exctype, value = sys.exc_info()[:2]
+                result.error = "%s: %s" % (exctype.__name__, value)
+            finally:
+                output.set_prefix('')
+
+    threads = []
+    with output.prefixed():
+        for _ in range(max(1, min(concurrency, len(items)))):
+            thread = threading.Thread(target=worker)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            # join with a timeout so KeyboardInterrupt still reaches us
+            while thread.is_alive():
+                thread.join(1)
+    return results
@@ -1,6 +1,8 @@
 """Various string functions"""
 import os
 
+from contextlib import contextmanager
+
 
 def write_file(f, value):
     """Write something into a file. Overwrite if existing, create if new"""
@@ -12,6 +14,20 @@ def write_file(f, value):
         raise TypeError
 
 
+def write_private(path, contents):
+    """Replace a file, readable only by the user, in one rename so readers
+    never see it half written. Creates its directory if needed.
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, 0o700)
+    temp_path = "%s.%s.tmp" % (path, os.getpid())
+    with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                           0o600), 'w') as handle:
+        handle.write(contents)
+    os.rename(temp_path, path)
+
+
 def delete_file(value):
     """Delete an individual file, or a list of files"""
     if isinstance(value, list):
@@ -23,3 +39,14 @@ def delete_file(value):
         os.remove(value)
     else:
         raise TypeError
+
+
+@contextmanager
+def working_directory(path):
+    """Change into a directory and back again afterwards"""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
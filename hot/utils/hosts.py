@@ -4,6 +4,8 @@ Original file has been modified to meet our needs. The primary differences:
   - Removed some of the in line comments
   - Removal of compare_ip function (not compatible with IPv6 addresses)
   - IP's stored as arrays (some OS's have multiple localhost definitions)
+  - Single pass parser that ignores inline comments
+  - Atomic writes, and transactions that undo their changes on exit
 
 Copyright (c) 2012 Michael Dominice
 
@@ -28,10 +30,19 @@ WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
 FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 OTHER DEALINGS IN THE SOFTWARE.
 '''
+import binascii
 import datetime
 import os
-import re
 import socket
+import subprocess
+import tempfile
+
+# Lines added by a Transaction sit between these markers, so they can be
+# removed again without touching the rest of the file.
+BEGIN_MARKER = '# Added by hot, removed when the test is done'
+END_MARKER = '# End of entries added by hot'
+# Used with `sudo mv` when the hosts file cannot be written directly.
+SUDO_TEMP_FILE = '/tmp/etc_hosts.tmp'
 
 
 def get_created_comment():
@@ -88,16 +99,21 @@ class Hosts(object):
     def read(self, path):
         """Read the hosts file at the given location and parse the contents"""
         with open(path, 'r') as hosts_file:
-            for line in hosts_file.read().split('\n'):
-                if len(re.sub('\s*', '', line)) and not line.startswith('#'):
-                    line = re.sub('\s+$', '', line)  # Remove spaces at EOL
-                    parts = re.split('\s+', line)
-                    ip_address = parts[0]
-                    for host_name in parts[1:]:
-                        if host_name in self.hosts:
-                            self.hosts[host_name].append(ip_address)
-                        else:
-                            self.hosts[host_name] = [ip_address]
+            self.parse(hosts_file)
+
+    def parse(self, lines):
+        """Add the mappings of hosts file lines, in one pass per line"""
+        hosts = self.hosts
+        for line in lines:
+            parts = line.split('#', 1)[0].split()
+            if len(parts) < 2:
+                continue
+            ip_address = parts[0]
+            for host_name in parts[1:]:
+                if host_name in hosts:
+                    hosts[host_name].append(ip_address)
+                else:
+                    hosts[host_name] = [ip_address]
 
     def remove_one(self, host_name):
         """Remove a mapping for the given host_name"""
@@ -110,20 +126,7 @@ class Hosts(object):
 
     def write(self, path):
         """Write the contents of this hosts definition to the provided path"""
-        try:
-            contents = self.file_contents()
-        except Exception as e:
-            raise e
-        try:
-            with open(path, 'wb') as hosts_file:
-                hosts_file.write(contents)
-        except IOError:
-            try:
-                with open("/tmp/etc_hosts.tmp", 'wb') as hosts_file:
-                    hosts_file.write(contents)
-                    os.system('sudo mv /tmp/etc_hosts.tmp /etc/hosts')
-            except Exception as e:
-                raise e
+        write_file(path, self.file_contents())
 
     def set_one(self, host_name, ip_address):
         """Set the given hostname to map to the given IP address"""
@@ -147,6 +150,131 @@ class Hosts(object):
         """Set hostnames to map to the IP address that target maps to"""
         self.set_all(host_names, self.get_one(target, raise_on_not_found=True))
 
+
+def write_file(path, contents):
+    """Replace the file at `path` with `contents` in one step. Writes to a
+    temporary file next to it and renames it over the original. Where that
+    is not possible, e.g. for a bind-mounted /etc/hosts in a container, the
+    file is overwritten in place, or moved into place with sudo.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except OSError:
+        mode = 0o644
+    try:
+        handle, temp_path = tempfile.mkstemp(dir=directory, prefix='.hosts.')
+        try:
+            with os.fdopen(handle, 'wb') as hosts_file:
+                hosts_file.write(contents)
+            os.chmod(temp_path, mode)
+            os.rename(temp_path, path)
+            return
+        except (IOError, OSError):
+            os.remove(temp_path)
+    except (IOError, OSError):
+        pass
+    try:
+        with open(path, 'wb') as hosts_file:
+            hosts_file.write(contents)
+        return
+    except (IOError, OSError):
+        pass
+    with open(SUDO_TEMP_FILE, 'wb') as hosts_file:
+        hosts_file.write(contents)
+    os.chmod(SUDO_TEMP_FILE, mode)
+    subprocess.check_call(['sudo', 'mv', SUDO_TEMP_FILE, path])
+
+
+def markers(tag):
+    """Return the lines that start and end the block of entries tagged
+    `tag`"""
+    return ('%s [%s]' % (BEGIN_MARKER, tag), '%s [%s]' % (END_MARKER, tag))
+
+
+def without_entries(contents, tag):
+    """Return hosts file contents without the block of lines added by the
+    transaction tagged `tag`"""
+    begin, end = markers(tag)
+    kept = []
+    added = False
+    for line in contents.splitlines(True):
+        stripped = line.strip()
+        if stripped == begin:
+            added = True
+        elif added and stripped == end:
+            added = False
+        elif not added:
+            kept.append(line)
+    return ''.join(kept)
+
+
+class Transaction(object):
+    """Batch of hosts file entries that are written in one go and removed
+    again when the transaction ends, leaving other changes to the file alone.
+    Added entries go to the top of the file, so they win over existing
+    mappings of the same host names. Each transaction tags its block with the
+    process id and a random token, so transactions running at the same time
+    only ever remove their own entries. Use it as a context manager:
+
+        with Transaction('/etc/hosts') as hosts:
+            hosts.set_all(['example.com'], '1.2.3.4')
+            hosts.commit()
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+        self.committed = False
+        self.tag = '%s-%s' % (os.getpid(), binascii.hexlify(os.urandom(4)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.rollback()
+
+    def set_one(self, host_name, ip_address):
+        """Map the given hostname to the given IP address on commit"""
+        if not isinstance(host_name, str):
+            raise TypeError
+        self.entries.append((ip_address, host_name))
+
+    def set_all(self, host_names, ip_address):
+        """Map the given list of hostnames to the given IP address on
+        commit"""
+        if not isinstance(host_names, list):
+            raise TypeError
+        for host_name in host_names:
+            self.set_one(host_name, ip_address)
+
+    def contents(self, current):
+        """Return `current` hosts file contents with the entries added"""
+        begin, end = markers(self.tag)
+        lines = [begin]
+        lines.extend('%s\t%s' % entry for entry in self.entries)
+        lines.append(end)
+        return '\n'.join(lines) + '\n' + without_entries(current, self.tag)
+
+    def commit(self):
+        """Write all entries to the hosts file at once"""
+        if not self.entries:
+            return
+        with open(self.path, 'rb') as hosts_file:
+            current = hosts_file.read()
+        write_file(self.path, self.contents(current))
+        self.committed = True
+
+    def rollback(self):
+        """Remove the committed entries from the hosts file"""
+        if not self.committed:
+            return
+        with open(self.path, 'rb') as hosts_file:
+            current = hosts_file.read()
+        write_file(self.path, without_entries(current, self.tag))
+        self.committed = False
+
+
 if __name__ == '__main__':
     import argparse
 
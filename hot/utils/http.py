@@ -0,0 +1,90 @@
+"""Process-wide, connection-pooled HTTP session for all outbound requests.
+
+Connections are kept alive and reused, so TLS handshakes are paid once per
+host instead of once per request. Pool sizes and the default timeout can be
+set with the HOT_HTTP_POOL_CONNECTIONS, HOT_HTTP_POOL_MAXSIZE and
+HOT_HTTP_TIMEOUT environment variables, or with `configure`.
+"""
+import os
+import threading
+
+# Number of hosts to keep connection pools for
+POOL_CONNECTIONS = int(os.environ.get('HOT_HTTP_POOL_CONNECTIONS', 10))
+# Number of connections to keep open per host
+POOL_MAXSIZE = int(os.environ.get('HOT_HTTP_POOL_MAXSIZE', 20))
+# Default seconds to wait for a connection or a response
+TIMEOUT = float(os.environ.get('HOT_HTTP_TIMEOUT', 60))
+
+_session = None
+_lock = threading.Lock()
+
+
+def configure(pool_connections=None, pool_maxsize=None, timeout=None):
+    """Change pool sizes or the default timeout. Takes effect for the session
+    created after the call.
+    """
+    global POOL_CONNECTIONS, POOL_MAXSIZE, TIMEOUT, _session
+    with _lock:
+        if pool_connections is not None:
+            POOL_CONNECTIONS = pool_connections
+        if pool_maxsize is not None:
+            POOL_MAXSIZE = pool_maxsize
+        if timeout is not None:
+            TIMEOUT = timeout
+        _session = None
+
+
+def get_session():
+    """Return the shared requests session, creating it on first use"""
+    global _session
+    import requests
+    from requests.adapters import HTTPAdapter
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                                  pool_maxsize=POOL_MAXSIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+
+def request(method, url, **kwargs):
+    """Send a request through the shared session with the default timeout
+    unless another one is given.
+    """
+    kwargs.setdefault('timeout', TIMEOUT)
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def head(url, **kwargs):
+    kwargs.setdefault('allow_redirects', True)
+    return request('HEAD', url, **kwargs)
+
+
+def post(url, data=None, **kwargs):
+    return request('POST', url, data=data, **kwargs)
+
+
+def keystone_session(insecure=False):
+    """Return a keystone session that sends requests over the shared
+    session.
+    """
+    from keystoneclient import session
+    return session.Session(session=get_session(), verify=not insecure,
+                           timeout=TIMEOUT)
+
+
+def heat_client(endpoint, token, insecure=False):
+    """Return a heat client that sends requests over the shared session. The
+    token can be replaced later through `client.http_client.auth.token`.
+    """
+    from heatclient.v1 import Client
+    from keystoneclient.auth import token_endpoint
+    return Client(endpoint=endpoint, session=keystone_session(insecure),
+                  auth=token_endpoint.Token(endpoint, token))
@@ -0,0 +1,122 @@
+"""Check that URLs are reachable, remembering the answer between runs"""
+import json
+import os
+import threading
+import time
+
+from hot.utils import executor
+from hot.utils import files
+from hot.utils import http
+
+# Reachable URLs are remembered here. Set HOT_LINK_CACHE to another path, or
+# to an empty string to disable the cache.
+LINK_CACHE = '~/.hot/links.json'
+# Seconds a URL is trusted to stay reachable before it is checked again.
+# After that a conditional request is sent, so unchanged resources are not
+# downloaded. Set HOT_LINK_TTL to change it.
+LINK_TTL = 24 * 60 * 60
+# Entries not checked for this many seconds are dropped from the cache.
+FORGET_AFTER = 30 * 24 * 60 * 60
+# Seconds to wait for each check.
+CHECK_TIMEOUT = 10
+# Number of URLs checked at the same time.
+CHECK_WORKERS = 8
+
+
+class LinkCache(object):
+    """JSON file of reachable URLs with their validators (ETag and
+    Last-Modified) and when they were last checked. Unreachable URLs are not
+    remembered, so they are checked again on every run.
+    """
+
+    def __init__(self, path, ttl=LINK_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = self.load()
+
+    def check(self, url, timeout=CHECK_TIMEOUT):
+        """Return (reachable, reason) for a URL"""
+        with self.lock:
+            entry = self.entries.get(url)
+        now = time.time()
+        if entry and now - entry['checked'] < self.ttl:
+            return True, None
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            response = http.head(url, headers=headers, timeout=timeout)
+            if response.status_code in (405, 501):
+                # HEAD not supported, fetch only the headers
+                response = http.get(url, headers=headers, timeout=timeout,
+                                    stream=True)
+                response.close()
+        except Exception as exc:
+            with self.lock:
+                self.entries.pop(url, None)
+            return False, str(exc)
+        with self.lock:
+            if response.status_code == 304 and entry:
+                entry['checked'] = now
+                return True, None
+            if response.ok:
+                self.entries[url] = {
+                    'checked': now,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                }
+                return True, None
+            self.entries.pop(url, None)
+        return False, "HTTP %s" % response.status_code
+
+    def load(self):
+        if not self.path:
+            return {}
+        try:
+            with open(self.path) as handle:
+                entries = json.load(handle)
+        except (IOError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def save(self):
+        """Write the entries, merged with those other processes saved"""
+        if not self.path:
+            return
+        with self.lock:
+            entries = self.load()
+            entries.update(self.entries)
+            now = time.time()
+            entries = dict((url, entry) for url, entry in entries.items()
+                           if now - entry.get('checked', 0) < FORGET_AFTER)
+            try:
+                files.write_private(self.path, json.dumps(entries))
+            except (IOError, OSError) as exc:
+                print("Unable to cache link checks in %s: %s" % (self.path,
+                                                                 exc))
+
+
+def get_cache():
+    path = os.path.expanduser(os.environ.get('HOT_LINK_CACHE', LINK_CACHE))
+    ttl = float(os.environ.get('HOT_LINK_TTL', LINK_TTL))
+    return LinkCache(path, ttl)
+
+
+def check(urls, cache=None, concurrency=CHECK_WORKERS,
+          timeout=CHECK_TIMEOUT):
+    """Check URLs concurrently. Returns a dict of url to (reachable,
+    reason).
+    """
+    urls = sorted(set(urls))
+    if not urls:
+        return {}
+    cache = cache or get_cache()
+    results = executor.run(lambda url: cache.check(url, timeout), urls,
+                           concurrency)
+    cache.save()
+    return dict((url, result.value if result.passed
+                 else (False, result.error))
+                for url, result in zip(urls, results))
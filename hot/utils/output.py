@@ -0,0 +1,83 @@
+"""Keep output readable when several threads print at the same time"""
+import sys
+import threading
+
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+def set_prefix(prefix):
+    """Set the prefix used for lines printed by the current thread"""
+    _local.prefix = prefix
+
+
+def get_prefix():
+    """Return the prefix used for lines printed by the current thread"""
+    return getattr(_local, 'prefix', '')
+
+
+class PrefixedStream(object):
+    """File-like wrapper that buffers writes per thread and emits whole lines
+    prefixed with the thread's prefix, so lines from different threads never
+    interleave.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.buffers = threading.local()
+
+    def _buffer(self):
+        if not hasattr(self.buffers, 'value'):
+            self.buffers.value = ''
+        return self.buffers.value
+
+    def write(self, data):
+        pending = self._buffer() + data
+        lines = pending.split('\n')
+        self.buffers.value = lines.pop()
+        if lines:
+            prefix = get_prefix()
+            with self.lock:
+                for line in lines:
+                    self.stream.write("%s%s\n" % (prefix, line))
+
+    @property
+    def softspace(self):
+        """`print` keeps track of a pending space here; per thread, so one
+        thread's `print x,` does not indent another thread's next line
+        """
+        return getattr(self.buffers, 'softspace', 0)
+
+    @softspace.setter
+    def softspace(self, value):
+        self.buffers.softspace = value
+
+    def flush(self):
+        pending = self._buffer()
+        with self.lock:
+            if pending:
+                self.stream.write(get_prefix() + pending)
+                self.buffers.value = ''
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+@contextmanager
+def prefixed():
+    """Route stdout through a PrefixedStream for the duration of the block,
+    unless it already is
+    """
+    original = sys.stdout
+    if isinstance(original, PrefixedStream):
+        yield original
+        return
+    sys.stdout = PrefixedStream(original)
+    try:
+        yield sys.stdout
+    finally:
+        sys.stdout.flush()
+        sys.stdout = original
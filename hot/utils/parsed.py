@@ -0,0 +1,168 @@
+"""Keep parsed files between runs so unchanged files are not parsed again"""
+import cPickle
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Parsed files are cached here, shared by every repo and subcommand. Set
+# HOT_PARSE_CACHE to another path, or to an empty string to disable the cache.
+PARSE_CACHE = '~/.hot/parsed.db'
+# Once the pickled entries grow past this many bytes, the least recently used
+# ones are dropped. Set HOT_PARSE_CACHE_SIZE to change it.
+MAX_BYTES = 64 * 1024 * 1024
+# Files modified less than this many seconds ago might change again without
+# their size or mtime changing, so their content is always hashed.
+RACY_WINDOW = 2
+# Errors from unpickling an entry that was cut short or written by an older
+# version of hot. Such entries are dropped and the file parsed again.
+UNPICKLE_ERRORS = (cPickle.UnpicklingError, EOFError, ValueError,
+                   AttributeError)
+
+_cache = None
+_lock = threading.Lock()
+
+
+class ParseCache(object):
+    """sqlite store of pickled parse results.
+
+    An entry is found by path, size and mtime without reading the file. When
+    those changed, the file is read and its content hash is looked up, so a
+    touched or copied file with known content is still not parsed again.
+    """
+
+    def __init__(self, path, max_bytes=MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, 0o700)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS parsed ("
+                            "path TEXT, variant TEXT, size INTEGER, "
+                            "mtime REAL, digest TEXT, data BLOB, "
+                            "bytes INTEGER, used REAL, "
+                            "PRIMARY KEY (path, variant))")
+            self.db.execute("CREATE INDEX IF NOT EXISTS parsed_digest "
+                            "ON parsed (digest, variant)")
+        os.chmod(path, 0o600)
+
+    def load(self, path, parse, variant=''):
+        """Return `parse(content)` for the file at `path`, from the cache
+        when possible. `variant` tells apart different ways of parsing the
+        same file.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        if time.time() - stat.st_mtime > RACY_WINDOW:
+            row = self.fetch("path = ? AND variant = ? AND size = ? AND "
+                             "mtime = ?", (path, variant, stat.st_size,
+                                           stat.st_mtime))
+            if row:
+                try:
+                    return cPickle.loads(str(row[0]))
+                except UNPICKLE_ERRORS:
+                    self.drop(row[1])
+        with open(path) as handle:
+            content = handle.read()
+        digest = hashlib.sha1(content).hexdigest()
+        row = self.fetch("digest = ? AND variant = ?", (digest, variant))
+        if row:
+            data = row[0]
+            try:
+                result = cPickle.loads(str(data))
+            except UNPICKLE_ERRORS:
+                self.drop(row[1])
+                row = None
+        if not row:
+            result = parse(content)
+            data = cPickle.dumps(result, cPickle.HIGHEST_PROTOCOL)
+        self.store(path, variant, stat, digest, data)
+        return result
+
+    def fetch(self, where, args):
+        """Return the data of the first matching entry and mark it used"""
+        with self.lock, self.db:
+            row = self.db.execute("SELECT data, rowid FROM parsed WHERE " +
+                                  where, args).fetchone()
+            if row:
+                self.db.execute("UPDATE parsed SET used = ? WHERE rowid = ?",
+                                (time.time(), row[1]))
+        return row
+
+    def drop(self, rowid):
+        """Delete an entry that can no longer be read"""
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM parsed WHERE rowid = ?", (rowid,))
+
+    def store(self, path, variant, stat, digest, data):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO parsed VALUES "
+                            "(?, ?, ?, ?, ?, ?, ?, ?)",
+                            (path, variant, stat.st_size, stat.st_mtime,
+                             digest, sqlite3.Binary(data), len(data),
+                             time.time()))
+            self.evict()
+
+    def evict(self):
+        """Drop the least recently used entries beyond `max_bytes`"""
+        total = 0
+        stale = []
+        for rowid, size in self.db.execute("SELECT rowid, bytes FROM parsed "
+                                           "ORDER BY used DESC"):
+            total += size
+            if total > self.max_bytes:
+                stale.append((rowid,))
+        self.db.executemany("DELETE FROM parsed WHERE rowid = ?", stale)
+
+    def size(self):
+        """Total bytes of all cached entries"""
+        with self.lock:
+            return self.db.execute("SELECT COALESCE(SUM(bytes), 0) "
+                                   "FROM parsed").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def get_cache():
+    """Return the shared cache, or None if it is disabled or unusable"""
+    global _cache
+    with _lock:
+        if _cache is None:
+            path = os.path.expanduser(os.environ.get('HOT_PARSE_CACHE',
+                                                     PARSE_CACHE))
+            max_bytes = int(os.environ.get('HOT_PARSE_CACHE_SIZE', MAX_BYTES))
+            _cache = False
+            if path:
+                try:
+                    _cache = ParseCache(path, max_bytes)
+                except (OSError, sqlite3.Error) as exc:
+                    print("Unable to open parse cache %s: %s" % (path, exc))
+        return _cache or None
+
+
+def reset():
+    """Forget the shared cache, e.g. in a freshly forked process that must
+    not reuse its parent's database connection.
+    """
+    global _cache
+    with _lock:
+        _cache = None
+
+
+def load_file(path, parse, variant=''):
+    """Return `parse(content)` for the file at `path`, using the shared cache
+    when it is enabled.
+    """
+    cache = get_cache()
+    if cache:
+        try:
+            return cache.load(path, parse, variant)
+        except (sqlite3.Error,) + UNPICKLE_ERRORS as exc:
+            print("Unable to use parse cache: %s" % exc)
+    with open(path) as handle:
+        return parse(handle.read())
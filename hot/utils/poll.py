@@ -0,0 +1,296 @@
+"""Decide when and how often to check on the status of a stack"""
+import math
+import threading
+import time
+
+INITIAL_INTERVAL = 2
+BACKOFF_FACTOR = 2
+# Fraction of a stack's resources that must be complete before polling
+# tightens back to NEAR_DONE_INTERVAL.
+NEAR_DONE = 0.8
+NEAR_DONE_INTERVAL = 4
+# Number of polls at the maximum interval between resource progress checks.
+PROBE_EVERY = 2
+# Stack list requests in a row that may fail before the stacks due for a
+# check are failed with the last error.
+MAX_TICK_FAILURES = 3
+# Slack when rounding check times to the poller's shared schedule, so float
+# error never pushes a check one whole interval back.
+SCHEDULE_SLACK = 1e-6
+
+
+def is_terminal(stack_status):
+    """True if heat is no longer working on the stack"""
+    return not stack_status.endswith('_IN_PROGRESS')
+
+
+def is_done(stack_status, action='CREATE'):
+    """True if heat has finished `action` on the stack. Right after an update
+    request the stack may still show the previous action's final state, so
+    only states of `action` or a rollback count.
+    """
+    if not is_terminal(stack_status):
+        return False
+    if action == 'CREATE':
+        return True
+    return stack_status.startswith(action + '_') or \
+        stack_status.startswith('ROLLBACK_')
+
+
+def is_success(stack_status, action='CREATE'):
+    """True if the stack finished `action` successfully"""
+    return stack_status == '%s_COMPLETE' % action
+
+
+def stack_progress(hc, stack_id):
+    """Return the fraction of the stack's resources that are complete"""
+    resources = hc.resources.list(stack_id)
+    if not resources:
+        return 0.0
+    complete = [r for r in resources
+                if r.resource_status.endswith('_COMPLETE') and
+                r.resource_status != 'INIT_COMPLETE']
+    return float(len(complete)) / len(resources)
+
+
+class ActionTracker(object):
+    """Tell when heat has finished `action` on a stack.
+
+    Right after an update request the stack may still show the final state
+    of the previous update, so anything but a create only counts as finished
+    once the stack was seen in progress or its `updated_time` moved on from
+    the one it had before the request.
+    """
+
+    def __init__(self, action='CREATE', updated_time=None):
+        self.action = action
+        self.updated_time = updated_time
+        self.started = action == 'CREATE'
+
+    def done(self, status):
+        """True if `status` shows the action finished"""
+        if not is_terminal(status.stack_status):
+            self.started = True
+            return False
+        if not is_done(status.stack_status, self.action):
+            return False
+        return self.started or \
+            getattr(status, 'updated_time', None) != self.updated_time
+
+
+class Backoff(object):
+    """Exponential backoff from a short first interval up to `cap` seconds.
+
+    Once the stack is close to done, `tighten` lowers the cap so the final
+    state is picked up quickly.
+    """
+
+    def __init__(self, cap=15, initial=INITIAL_INTERVAL,
+                 factor=BACKOFF_FACTOR, near_done=NEAR_DONE_INTERVAL):
+        self.cap = cap
+        self.initial = min(initial, cap)
+        self.factor = factor
+        self.near_done = min(near_done, cap)
+        self.interval = None
+        self.tightened = False
+        self.polls_at_cap = 0
+
+    def next(self):
+        """Return the number of seconds to wait before the next poll"""
+        if self.interval is None:
+            self.interval = self.initial
+        else:
+            self.interval = min(self.interval * self.factor, self.cap)
+        if self.interval >= self.cap:
+            self.polls_at_cap += 1
+        return self.interval
+
+    def should_probe(self):
+        """True if it is worth checking how far along the stack is"""
+        if self.tightened or self.interval < self.cap:
+            return False
+        return (self.polls_at_cap - 1) % PROBE_EVERY == 0
+
+    def tighten(self):
+        """Poll at the near done interval from now on"""
+        self.tightened = True
+        self.cap = self.near_done
+        self.interval = min(self.interval, self.cap)
+
+
+def align(when, interval, epoch):
+    """Round `when` up to a whole number of `interval`s after `epoch`"""
+    steps = math.ceil((when - epoch) / interval - SCHEDULE_SLACK)
+    return epoch + steps * interval
+
+
+class StackWaiter(object):
+    """A stack watched by a StackPoller.
+
+    Check times are rounded to whole backoff intervals since the poller's
+    `epoch`, so stacks watched at different moments are due at the very
+    same ticks and share one stack list request.
+    """
+
+    def __init__(self, stack_id, sleeper, deadline=None, action='CREATE',
+                 updated_time=None, epoch=None):
+        self.stack_id = stack_id
+        self.deadline = deadline
+        self.action = action
+        self.tracker = ActionTracker(action, updated_time)
+        self.backoff = Backoff(cap=sleeper)
+        self.epoch = time.time() if epoch is None else epoch
+        self.due = None
+        self.schedule(time.time(), self.backoff.next())
+        self.status = None
+        self.error = None
+        self.done = threading.Event()
+
+    def schedule(self, after, interval):
+        """Make the stack due at the first tick `interval` seconds or more
+        after `after`, but no later than its deadline
+        """
+        self.due = align(after + interval, interval, self.epoch)
+        if self.deadline and self.deadline.expires:
+            self.due = min(self.due, self.deadline.expires)
+
+    def finish(self, status=None, error=None):
+        self.status = status
+        self.error = error
+        self.done.set()
+
+    def wait(self):
+        """Block until the stack reaches a terminal state and return it"""
+        while not self.done.is_set():
+            self.done.wait(1)
+        if self.error is not None:
+            raise self.error
+        return self.status
+
+
+class StackPoller(object):
+    """Refresh the status of every in-flight stack with a single stack list
+    request per tick, filtered down to the ids being watched, and wake up
+    each waiter when its stack reaches a terminal state.
+    """
+
+    def __init__(self, hc, sleeper=15):
+        self.hc = hc
+        self.sleeper = sleeper
+        self.epoch = time.time()
+        self.waiters = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def watch(self, stack_id, deadline=None, action='CREATE',
+              updated_time=None):
+        """Start watching a stack until it finishes `action` and return its
+        StackWaiter. The waiter fails if the stack is still in progress when
+        its `deadline` passes. For updates, `updated_time` is the stack's
+        before the update request.
+        """
+        waiter = StackWaiter(stack_id, self.sleeper, deadline, action,
+                             updated_time, self.epoch)
+        with self.lock:
+            self.waiters[stack_id] = waiter
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run)
+                self.thread.daemon = True
+                self.thread.start()
+        self.wakeup.set()
+        return waiter
+
+    def release(self, stack_id):
+        with self.lock:
+            self.waiters.pop(stack_id, None)
+
+    def run(self):
+        failures = 0
+        while True:
+            self.expire()
+            with self.lock:
+                if not self.waiters:
+                    self.thread = None
+                    return
+                delay = min(w.due for w in self.waiters.values()) - \
+                    time.time()
+            if delay > 0:
+                self.wakeup.wait(delay)
+                self.wakeup.clear()
+                continue
+            try:
+                self.tick()
+                failures = 0
+            except Exception as exc:
+                failures += 1
+                print("  Unable to check stack status: %s" % exc)
+                give_up = failures >= MAX_TICK_FAILURES
+                self.retry(exc, give_up)
+                if give_up:
+                    failures = 0
+
+    def expire(self):
+        """Fail every waiter whose deadline has passed, whether or not its
+        stack could be checked
+        """
+        with self.lock:
+            waiters = self.waiters.values()
+        for waiter in waiters:
+            if waiter.deadline and waiter.deadline.expired():
+                self.release(waiter.stack_id)
+                try:
+                    waiter.deadline.check()
+                except Exception as exc:
+                    waiter.finish(error=exc)
+
+    def retry(self, error, give_up=False):
+        """Check the stacks that were due again in `sleeper` seconds, or
+        fail them with `error` if `give_up` is set
+        """
+        now = time.time()
+        with self.lock:
+            due = [w for w in self.waiters.values() if w.due <= now]
+        for waiter in due:
+            if give_up:
+                self.release(waiter.stack_id)
+                waiter.finish(error=error)
+                continue
+            waiter.schedule(now, self.sleeper)
+
+    def tick(self):
+        """Fetch the status of all stacks due for a check in one request"""
+        now = time.time()
+        with self.lock:
+            waiters = dict((stack_id, waiter)
+                           for stack_id, waiter in self.waiters.items()
+                           if waiter.due <= now)
+        if not waiters:
+            return
+        stacks = self.hc.stacks.list(filters={'id': waiters.keys()})
+        found = dict((stack.id, stack) for stack in stacks)
+        for stack_id, waiter in waiters.items():
+            status = found.get(stack_id)
+            if status is None:
+                # Not listed, so ask for this one stack directly
+                try:
+                    status = self.hc.stacks.get(stack_id)
+                except Exception as exc:
+                    self.release(stack_id)
+                    waiter.finish(error=exc)
+                    continue
+            if waiter.tracker.done(status):
+                self.release(stack_id)
+                waiter.finish(status)
+                continue
+            if waiter.deadline:
+                try:
+                    waiter.deadline.check()
+                except Exception as exc:
+                    self.release(stack_id)
+                    waiter.finish(error=exc)
+                    continue
+            # Count from the tick the stack was due at, so a slow request
+            # does not move it off the shared schedule
+            interval = waiter.backoff.next()
+            waiter.schedule(max(waiter.due, now - interval), interval)
@@ -4,8 +4,6 @@ import os
 import shutil
 import sys
 
-from git import Git, GitCommandError
-
 
 def check(path):
     """ Determine if a command that expects to execute inside a template
@@ -47,6 +45,7 @@ def check(path):
 
 
 def clone_repo(repo, path, branch=None, git_init=True):
+    from git import Git
     if branch:
         Git().clone('--branch', branch, repo, path)
     else:
@@ -61,6 +60,7 @@ def clone_repo(repo, path, branch=None, git_init=True):
 
 
 def valid_branch_name(branch):
+    from git import Git, GitCommandError
     try:
         Git().check_ref_format("--branch", branch)
         return True
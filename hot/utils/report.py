@@ -0,0 +1,185 @@
+"""Time each phase of a test run and write the results as JSON and JUnit XML
+
+Test cases are tracked per thread, so phases timed while a thread works on a
+case are added to that case. Phases timed outside of any case, such as
+authentication, belong to the run itself.
+"""
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+REPORT_FILE = 'hot-report.json'
+JUNIT_FILE = 'hot-junit.xml'
+
+_local = threading.local()
+_lock = threading.Lock()
+
+
+class Case(object):
+    """Timings and outcome of one test stack"""
+
+    def __init__(self, name, suite='hot'):
+        self.name = name
+        self.suite = suite
+        self.phases = []
+        self.commands = []
+        self.started = time.time()
+        self.seconds = None
+        self.passed = None
+        self.failure = None
+
+    def to_dict(self):
+        return {'name': self.name, 'suite': self.suite,
+                'passed': self.passed, 'failure': self.failure,
+                'started': self.started, 'seconds': self.seconds,
+                'phases': [{'phase': name, 'seconds': seconds}
+                           for name, seconds in self.phases],
+                'commands': self.commands}
+
+
+class Run(object):
+    """All cases of one `hot` invocation"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.phases = []
+        self.cases = []
+
+    def to_dict(self):
+        return {'started': self.started,
+                'seconds': time.time() - self.started,
+                'phases': [{'phase': name, 'seconds': seconds}
+                           for name, seconds in self.phases],
+                'cases': [c.to_dict() for c in self.cases]}
+
+
+_run = Run()
+
+
+def start():
+    """Forget everything recorded so far and start a new run"""
+    global _run
+    with _lock:
+        _run = Run()
+    return _run
+
+
+def current():
+    return _run
+
+
+@contextmanager
+def case(name, suite='hot'):
+    """Record a test case. It passes unless the block raises or exits."""
+    record = Case(name, suite)
+    with _lock:
+        _run.cases.append(record)
+    previous = getattr(_local, 'case', None)
+    _local.case = record
+    try:
+        yield record
+        record.passed = True
+    except SystemExit as exc:
+        record.passed = False
+        record.failure = str(exc.code)
+        raise
+    except Exception as exc:
+        record.passed = False
+        record.failure = "%s: %s" % (type(exc).__name__, exc)
+        raise
+    finally:
+        record.seconds = time.time() - record.started
+        _local.case = previous
+
+
+@contextmanager
+def phase(name):
+    """Time a phase of the current thread's test case, or of the run"""
+    start_time = time.time()
+    try:
+        yield
+    finally:
+        add_phase(name, time.time() - start_time, current_case())
+
+
+def current_case():
+    """Return the current thread's test case, if any"""
+    return getattr(_local, 'case', None)
+
+
+def add_phase(name, seconds, record=None):
+    """Add a phase timed elsewhere, e.g. in a background thread, to
+    `record`, or to the run
+    """
+    with _lock:
+        (record or _run).phases.append((name, seconds))
+
+
+def command(result):
+    """Add a script command's result to the current thread's test case"""
+    record = getattr(_local, 'case', None)
+    if record:
+        with _lock:
+            record.commands.append(result)
+
+
+def write_json(path, run=None):
+    run = run or _run
+    with open(path, 'w') as handle:
+        json.dump(run.to_dict(), handle, indent=2, sort_keys=True)
+
+
+def write_junit(path, run=None):
+    """Write the cases as JUnit XML, one testcase per test stack with its
+    phase timings and script command output as output.
+    """
+    from xml.etree import ElementTree
+    run = run or _run
+    failures = [c for c in run.cases if not c.passed]
+    suite = ElementTree.Element('testsuite', {
+        'name': 'hot', 'tests': str(len(run.cases)),
+        'failures': str(len(failures)), 'errors': '0',
+        'time': "%.3f" % (time.time() - run.started)})
+    for record in run.cases:
+        element = ElementTree.SubElement(suite, 'testcase', {
+            'classname': record.suite, 'name': record.name,
+            'time': "%.3f" % (record.seconds or 0)})
+        if not record.passed:
+            failure = ElementTree.SubElement(element, 'failure', {
+                'message': record.failure or 'unknown'})
+            failure.text = record.failure
+        output = ElementTree.SubElement(element, 'system-out')
+        output.text = '\n'.join(["%s: %.3fs" % phase_time
+                                 for phase_time in record.phases] +
+                                [line for result in record.commands
+                                 for line in command_lines(result)])
+    ElementTree.ElementTree(suite).write(path, encoding='utf-8')
+
+
+def command_lines(result):
+    """Return a script command's result as lines of text"""
+    lines = ["$ %s (exit %s, %.3fs)" % (result['command'],
+                                        result['returncode'],
+                                        result['seconds'] or 0)]
+    if result.get('dropped_lines'):
+        lines.append("[%s earlier lines dropped]" % result['dropped_lines'])
+    lines.extend("[%+.3fs %s] %s" % (entry['time'], entry['stream'],
+                                     entry['line'])
+                 for entry in result['output'])
+    return lines
+
+
+def write(directory, run=None):
+    """Write the JSON report and JUnit XML into `directory` and return their
+    paths.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    paths = (os.path.join(directory, REPORT_FILE),
+             os.path.join(directory, JUNIT_FILE))
+    write_json(paths[0], run)
+    write_junit(paths[1], run)
+    return paths
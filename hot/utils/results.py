@@ -0,0 +1,39 @@
+"""Remember which test cases passed so unchanged ones can be skipped"""
+import os
+import sqlite3
+import threading
+import time
+
+
+class ResultCache(object):
+    """sqlite store of test case results keyed by a hash of everything the
+    test case depends on.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS results ("
+                            "key TEXT PRIMARY KEY, name TEXT, "
+                            "passed INTEGER, recorded REAL)")
+
+    def passed(self, key):
+        """True if a test case with this key passed before"""
+        with self.lock:
+            row = self.db.execute("SELECT passed FROM results WHERE key = ?",
+                                  (key,)).fetchone()
+        return bool(row and row[0])
+
+    def record(self, key, name, passed=True):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO results VALUES "
+                            "(?, ?, ?, ?)", (key, name, int(passed),
+                                             time.time()))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
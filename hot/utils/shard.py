@@ -0,0 +1,78 @@
+"""Split test cases between CI nodes so that all nodes finish at about the
+same time
+"""
+import json
+import os
+import threading
+
+# Weight of the latest run when updating a test case's recorded duration, so
+# the estimate follows real changes without jumping on a single slow run.
+LATEST_WEIGHT = 0.5
+
+
+class Timings(object):
+    """How long each test case took in earlier runs, kept in a JSON file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.durations = self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as handle:
+                durations = json.load(handle)
+        except (IOError, ValueError):
+            return {}
+        return durations if isinstance(durations, dict) else {}
+
+    def get(self, name):
+        with self.lock:
+            return self.durations.get(name)
+
+    def record(self, name, seconds):
+        with self.lock:
+            previous = self.durations.get(name)
+            if previous is not None:
+                seconds = LATEST_WEIGHT * seconds + \
+                    (1 - LATEST_WEIGHT) * previous
+            self.durations[name] = round(seconds, 1)
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        with self.lock:
+            try:
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory)
+                temp_path = "%s.%s.tmp" % (self.path, os.getpid())
+                with open(temp_path, 'w') as handle:
+                    json.dump(self.durations, handle, indent=2,
+                              sort_keys=True)
+                os.rename(temp_path, self.path)
+            except (IOError, OSError) as exc:
+                print("Unable to save test durations to %s: %s" % (self.path,
+                                                                   exc))
+
+
+def shard(names, durations, node_total):
+    """Split `names` into `node_total` lists with about equal total duration.
+
+    Longest cases are placed first, each on the node with the least work so
+    far. Cases without a recorded duration count as the average of the
+    others. Without any recorded durations, cases are dealt out round-robin.
+    The result only depends on the arguments, so every node computes the
+    same split.
+    """
+    shards = [[] for _ in range(node_total)]
+    known = [durations[name] for name in names if name in durations]
+    if not known:
+        for index, name in enumerate(names):
+            shards[index % node_total].append(name)
+        return shards
+    average = float(sum(known)) / len(known)
+    loads = [0.0] * node_total
+    for name in sorted(names, key=lambda n: (-durations.get(n, average), n)):
+        node = min(range(node_total), key=lambda i: (loads[i], i))
+        shards[node].append(name)
+        loads[node] += durations.get(name, average)
+    return shards
@@ -0,0 +1,169 @@
+"""Share SSH connections between the remote operations of a test stack
+
+Fabric keeps its connections in one cache keyed by host string and never
+closes them. Here each test stack gets a `Connections` that tracks them by
+host, user and key file, and closes them once the stack is deleted, so a
+later stack reusing an IP address never gets a stale connection.
+"""
+import os
+import threading
+
+from contextlib import contextmanager
+
+# Seconds between keep-alive packets on connections that do not set
+# fabric's `keepalive`.
+KEEPALIVE = 30
+# Remote operations that may use one connection at the same time.
+MAX_CHANNELS = 8
+
+_managers = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Connections(object):
+    """SSH connections of one test stack, keyed by (host, user, key file).
+
+    Connections live in fabric's own cache, so `run`, `get` and friends use
+    them. One made for other credentials, or before this manager took over,
+    is replaced instead of reused.
+    """
+
+    def __init__(self, keepalive=KEEPALIVE, max_channels=MAX_CHANNELS):
+        self.keepalive = keepalive
+        self.max_channels = max_channels
+        self.owned = {}
+        self.channels = {}
+        self.lock = threading.Lock()
+        self.held = threading.local()
+
+    def key(self, host_string=None):
+        """Return (host, port, user, key files) for `host_string`, or for
+        fabric's current host
+        """
+        from fabric.api import env
+        from fabric.network import normalize
+        user, host, port = normalize(host_string or env.host_string)
+        key_files = env.key_filename or ()
+        if isinstance(key_files, basestring):
+            key_files = (key_files,)
+        return (host, port, user,
+                tuple(os.path.abspath(path) for path in key_files))
+
+    def use(self, host_string=None):
+        """Drop fabric's connection to `host_string`, or its current host,
+        unless it is one of ours with the current credentials. Returns the
+        host string and the connection's key.
+        """
+        from fabric.api import env
+        from fabric.network import normalize_to_string
+        from fabric.state import connections
+        host_string = normalize_to_string(host_string or env.host_string)
+        key = self.key(host_string)
+        with self.lock:
+            owned = self.owned.get(host_string)
+            if host_string in connections and (
+                    not owned or owned[0] != key or
+                    dict.get(connections, host_string) is not owned[1]):
+                self.drop(host_string)
+            if key not in self.channels:
+                self.channels[key] = threading.BoundedSemaphore(
+                    self.max_channels)
+        return host_string, key
+
+    def adopt(self, host_string, key):
+        """Take over the connection fabric opened to `host_string`"""
+        from fabric.state import connections
+        with self.lock:
+            client = dict.get(connections, host_string)
+            if client is not None:
+                self.owned[host_string] = (key, client)
+
+    @contextmanager
+    def channel(self, host_string=None):
+        """Hold one of the channels to `host_string`, or fabric's current
+        host, while the block runs. Fabric connects on first use; the
+        connection is kept for the next block on the same host. A thread that
+        already holds a channel keeps using it.
+        """
+        from fabric.api import env, settings
+        if not (host_string or env.host_string):
+            yield
+            return
+        held = getattr(self.held, 'keys', None)
+        if held is None:
+            held = self.held.keys = set()
+        if self.key(host_string) in held:
+            yield
+            return
+        host_string, key = self.use(host_string)
+        with self.channels[key], \
+                settings(keepalive=env.keepalive or self.keepalive):
+            held.add(key)
+            try:
+                yield
+            finally:
+                held.discard(key)
+                self.adopt(host_string, key)
+
+    def drop(self, host_string):
+        """Close fabric's connection to `host_string`"""
+        from fabric.state import connections
+        client = dict.get(connections, host_string)
+        if client is not None:
+            client.close()
+            del connections[host_string]
+        self.owned.pop(host_string, None)
+
+    def close(self):
+        """Close every connection this manager opened"""
+        from fabric.state import connections
+        with self.lock:
+            for host_string, (_, client) in self.owned.items():
+                client.close()
+                if dict.get(connections, host_string) is client:
+                    del connections[host_string]
+            self.owned = {}
+
+
+def for_stack(stack_id):
+    """Return the connection manager of a test stack"""
+    with _lock:
+        if stack_id not in _managers:
+            _managers[stack_id] = Connections()
+        return _managers[stack_id]
+
+
+def current():
+    """Return the connection manager used by the current thread"""
+    manager = getattr(_local, 'manager', None)
+    return manager or for_stack(None)
+
+
+@contextmanager
+def using(stack_id):
+    """Send the current thread's remote operations through the stack's
+    connections while the block runs
+    """
+    previous = getattr(_local, 'manager', None)
+    _local.manager = for_stack(stack_id)
+    try:
+        yield _local.manager
+    finally:
+        _local.manager = previous
+
+
+def close(stack_id):
+    """Close the connections of a test stack, e.g. before it is deleted"""
+    with _lock:
+        manager = _managers.pop(stack_id, None)
+    if manager:
+        manager.close()
+
+
+def close_all():
+    with _lock:
+        managers = _managers.values()
+        _managers.clear()
+    for manager in managers:
+        manager.close()
@@ -1,13 +1,33 @@
 """Functions to help with testing."""
 import os
+import pipes
 import re
-import requests
-from fabric.api import get, hide, run
+import tarfile
+from fabric.api import env, get, hide, run
 from ast import literal_eval
 
+from hot.utils import executor
+from hot.utils import http
+from hot.utils import ssh
 
-def get_artifacts(artifacts=False, envvar='CIRCLE_ARTIFACTS'):
-    """Uses Fabric to get each artifact provided by the artifacts list."""
+
+# Logs collected by `get_artifacts` when no artifacts are given.
+DEFAULT_ARTIFACTS = ['/root/cfn-userdata.log', '/root/heat-script.log',
+                     '/tmp/heat_chef/*-*-*-*-*/*.log',
+                     '/var/log/cloud-init.log',
+                     '/var/log/cloud-init-output.log']
+# Hosts whose artifacts `collect_artifacts` fetches at the same time.
+ARTIFACT_WORKERS = 8
+MISSING = 'missing: '
+
+
+def get_artifacts(artifacts=False, envvar='CIRCLE_ARTIFACTS', bulk=True):
+    """Uses Fabric to get each artifact provided by the artifacts list.
+
+    Artifacts may be glob patterns. In bulk mode all of them come back from
+    the current host as one compressed tar stream, and the paths that did
+    not exist are returned.
+    """
 
     # Pull artifacts directory target from env vars
     directory = os.environ.get(envvar, 'tmp')
@@ -15,27 +35,127 @@ def get_artifacts(artifacts=False, envvar='CIRCLE_ARTIFACTS'):
     # Set default artifacts if none are supplied
     if artifacts:
         pass
+    elif bulk:
+        artifacts = DEFAULT_ARTIFACTS
     else:
         heat_logs = ['/root/cfn-userdata.log', '/root/heat-script.log']
         cloudinit_logs = ['/var/log/cloud-init.log',
                           '/var/log/cloud-init-output.log']
         code = "python -c 'from glob import glob; \
                     print glob(\"/tmp/heat_chef/*-*-*-*-*/*.log\")'"
-        chef_logs = literal_eval(run(code))
+        with ssh.current().channel():
+            chef_logs = literal_eval(run(code))
         artifacts = heat_logs + chef_logs + cloudinit_logs
 
-    for artifact in artifacts:
-        target = directory + "/%(host)s/%(path)s"
+    if bulk:
+        return fetch_artifacts(env.host_string, artifacts, directory)
+
+    with ssh.current().channel():
+        for artifact in artifacts:
+            target = directory + "/%(host)s/%(path)s"
+            try:
+                with hide('aborts'):
+                    get(artifact, target)
+            except:
+                pass
+
+
+def collect_artifacts(hosts=None, artifacts=None, envvar='CIRCLE_ARTIFACTS',
+                      concurrency=ARTIFACT_WORKERS):
+    """Fetch artifacts from all `hosts`, by default fabric's hosts, at the
+    same time. Returns a dict of host to the paths that did not exist. Hosts
+    that could not be reached are reported and left out.
+    """
+    hosts = hosts or env.hosts
+    directory = os.environ.get(envvar, 'tmp')
+    results = executor.run(
+        lambda host: fetch_artifacts(host, artifacts or DEFAULT_ARTIFACTS,
+                                     directory), hosts, concurrency)
+    missing = {}
+    for host, result in zip(hosts, results):
+        if result.passed:
+            missing[host] = result.value
+        else:
+            print("  Unable to fetch artifacts from %s: %s" % (
+                host, result.error))
+    return missing
+
+
+def fetch_artifacts(host_string, artifacts, directory):
+    """Stream the artifacts matching `artifacts` on one host into
+    `directory`/<host>/ as a single compressed tar and return the paths that
+    did not exist.
+    """
+    from fabric.network import normalize
+    from fabric.state import connections
+    target = os.path.join(directory, normalize(host_string)[1])
+    with ssh.current().channel(host_string):
+        channel = connections[host_string].get_transport().open_session()
         try:
-            with hide('aborts'):
-                get(artifact, target)
-        except:
-            pass
+            channel.exec_command(archive_command(artifacts))
+            extract_artifacts(channel.makefile('rb'), target)
+            errors = channel.makefile_stderr('rb').read().splitlines()
+            status = channel.recv_exit_status()
+        finally:
+            channel.close()
+    missing = [line[len(MISSING):] for line in errors
+               if line.startswith(MISSING)]
+    problems = [line for line in errors if not line.startswith(MISSING)]
+    if missing:
+        print("  Missing artifacts on %s: %s" % (
+            host_string, ", ".join(missing)))
+    if status and problems:
+        print("  Problems fetching artifacts from %s: %s" % (
+            host_string, "; ".join(problems)))
+    return missing
+
+
+def glob_quote(pattern):
+    """Quote `pattern` for a POSIX shell, leaving its wildcards active"""
+    return "".join(part if part in ('*', '?') else pipes.quote(part)
+                   for part in re.split(r'([*?])', pattern) if part)
+
+
+def archive_command(artifacts):
+    """Return a shell command that writes the existing artifacts as a gzipped
+    tar to stdout and names missing ones on stderr. Relative patterns are
+    relative to the remote home directory.
+    """
+    patterns = " ".join(glob_quote(pattern) for pattern in artifacts)
+    script = ("set --; for p in %s; do "
+              "if [ -e \"$p\" ]; then case $p in "
+              "/*) set -- \"$@\" \"${p#/}\";; "
+              "*) set -- \"$@\" \"${PWD#/}/$p\";; esac; "
+              "else echo \"%s$p\" >&2; fi; done; "
+              "if [ $# -gt 0 ]; then tar -C / -czf - \"$@\"; fi" % (
+                  patterns, MISSING))
+    return "sh -c %s" % pipes.quote(script)
+
+
+def extract_artifacts(stream, target):
+    """Unpack a gzipped tar stream of artifacts below `target`, skipping
+    anything that is not a plain file or directory inside it
+    """
+    root = os.path.abspath(target)
+    try:
+        archive = tarfile.open(fileobj=stream, mode='r|gz')
+    except tarfile.ReadError:
+        # Nothing was sent, none of the artifacts exist
+        return
+    try:
+        for member in archive:
+            path = os.path.abspath(os.path.join(root, member.name))
+            if not (member.isfile() or member.isdir()) or \
+                    not path.startswith(root + os.sep):
+                continue
+            archive.extract(member, root)
+    finally:
+        archive.close()
 
 
 def http_check(site, string):
     """Search the html of site with the string provided."""
-    with hide('running', 'stdout'):
+    with hide('running', 'stdout'), ssh.current().channel():
         wget_cmd = "wget --quiet --output-document - --no-check-certificate"
         homepage = run("{0} {1}".format(wget_cmd, site))
         if re.search(string, homepage):
@@ -47,7 +167,7 @@ def http_check(site, string):
 def local_http_check(url, string):
     """Run a local http request and search the html for the provided string."""
     try:
-        r = requests.get(url)
+        r = http.get(url)
         if re.search(string, r.content):
             return True
         else:
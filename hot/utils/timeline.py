@@ -0,0 +1,138 @@
+"""Work out how long each resource of a stack took to provision and which
+chain of dependent resources decided how long the whole stack took
+"""
+import datetime
+
+# Number of slowest resources listed in the summary.
+SLOWEST = 5
+
+
+def parse_time(value):
+    """Parse a heat event time such as 2015-03-11T18:51:22Z"""
+    value = value.replace(' ', 'T').rstrip('Z')
+    date, _, clock = value.partition('T')
+    for sign in '+-':
+        clock = clock.split(sign)[0]
+    return datetime.datetime.strptime("%sT%s" % (date, clock.split('.')[0]),
+                                      '%Y-%m-%dT%H:%M:%S')
+
+
+def intervals(events, resources=None, action='CREATE'):
+    """Return a dict of resource name to (start, end, status) built from the
+    stack's events for `action`. When a resource went through `action` more
+    than once, only the latest time counts. `start` and `end` are seconds
+    after the earliest start. Resources that never finished have an `end` of
+    None. Only names in `resources` are kept, if given, which drops the
+    stack's own events.
+    """
+    events = [(parse_time(e.event_time), e) for e in events
+              if e.resource_status.startswith(action + '_') and
+              (resources is None or e.resource_name in resources)]
+    events.sort(key=lambda item: item[0])
+    spans = {}
+    for when, event in events:
+        name = event.resource_name
+        if event.resource_status.endswith('_IN_PROGRESS'):
+            if name not in spans or spans[name][1] is not None:
+                spans[name] = (when, None, event.resource_status)
+        elif name in spans:
+            spans[name] = (spans[name][0], when, event.resource_status)
+    if not spans:
+        return {}
+    first = min(span[0] for span in spans.values())
+
+    def offset(when):
+        return None if when is None else (when - first).total_seconds()
+
+    return dict((name, (offset(start), offset(end), status))
+                for name, (start, end, status) in spans.items())
+
+
+def references(value):
+    """Yield the resource names `value` refers to with get_resource or
+    get_attr
+    """
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == 'get_resource' and isinstance(item, basestring):
+                yield item
+            elif key == 'get_attr' and isinstance(item, list) and item:
+                yield item[0]
+            else:
+                for name in references(item):
+                    yield name
+    elif isinstance(value, list):
+        for item in value:
+            for name in references(item):
+                yield name
+
+
+def dependencies(template):
+    """Return a dict of resource name to the set of resources it waits for,
+    from `depends_on`, `get_resource` and `get_attr`
+    """
+    resources = template.get('resources') or {}
+    graph = {}
+    for name, resource in resources.items():
+        if not isinstance(resource, dict):
+            graph[name] = set()
+            continue
+        depends_on = resource.get('depends_on') or []
+        if isinstance(depends_on, basestring):
+            depends_on = [depends_on]
+        needs = set(depends_on)
+        needs.update(references(resource.get('properties')))
+        graph[name] = set(n for n in needs if n in resources and n != name)
+    return graph
+
+
+def critical_path(spans, graph):
+    """Return the resources, first to last, that decided when the stack
+    finished. Starting from the resource that finished last, each step goes
+    back to the dependency that finished last, which is the one heat was
+    waiting for before it could start the next resource.
+    """
+    finished = dict((name, span[1]) for name, span in spans.items()
+                    if span[1] is not None)
+    if not finished:
+        return []
+    name = max(sorted(finished), key=lambda n: finished[n])
+    path = [name]
+    while True:
+        needs = [n for n in graph.get(name, ()) if n in finished]
+        if not needs:
+            break
+        name = max(sorted(needs), key=lambda n: finished[n])
+        if name in path:
+            break
+        path.append(name)
+    path.reverse()
+    return path
+
+
+def slowest(spans, count=SLOWEST):
+    """Return (name, seconds) of the resources that took longest"""
+    durations = [(name, span[1] - span[0]) for name, span in spans.items()
+                 if span[1] is not None]
+    durations.sort(key=lambda item: (-item[1], item[0]))
+    return durations[:count]
+
+
+def summary(events, template, action='CREATE'):
+    """Return the lines of a timeline report for a stack"""
+    graph = dependencies(template)
+    spans = intervals(events, graph, action)
+    if not spans:
+        return ["No %s events found." % action.lower()]
+    lines = ["Critical path:"]
+    for name in critical_path(spans, graph):
+        start, end, _ = spans[name]
+        lines.append("  %-30s %7.0fs  (%.0fs - %.0fs)" % (
+            name, end - start, start, end))
+    lines.append("Slowest resources:")
+    for name, seconds in slowest(spans):
+        lines.append("  %-30s %7.0fs" % (name, seconds))
+    unfinished = sorted(n for n, span in spans.items() if span[1] is None)
+    if unfinished:
+        lines.append("Never finished: %s" % ", ".join(unfinished))
+    return lines
@@ -1,6 +1,32 @@
 """Set timeout value for a given operation"""
+import time
 
 
-def handler(signum, frame):
-    print("  Failure! Operation failed to complete within timeout window.")
-    raise Exception("Operation timed out")
+class Deadline(object):
+    """Point in time by which an operation must be complete. Each operation
+    keeps its own deadline and checks it as it goes, so timeouts work in any
+    thread and for any number of operations at once.
+    """
+
+    def __init__(self, seconds=None):
+        self.seconds = seconds
+        if seconds:
+            self.expires = time.time() + seconds
+        else:
+            self.expires = None
+
+    def remaining(self):
+        """Seconds left before the deadline, infinite if there is none"""
+        if self.expires is None:
+            return float('inf')
+        return max(self.expires - time.time(), 0)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self):
+        """Raise if the deadline has passed"""
+        if self.expired():
+            print("  Failure! Operation failed to complete within timeout "
+                  "window.")
+            raise Exception("Operation timed out")
@@ -1,7 +1,8 @@
 """Functions for getting Auth Tokens from Racker Auth"""
 
 import json
-import requests
+
+from hot.utils import http
 
 
 def get_token(endpoint, username, password=None, api_key=None):
@@ -23,8 +24,8 @@ def get_token(endpoint, username, password=None, api_key=None):
     else:
         raise AttributeError('No Password or APIKey Specified')
 
-    response = requests.post(endpoint, data=json.dumps(payload),
-                             headers=headers)
+    response = http.post(endpoint, data=json.dumps(payload),
+                         headers=headers)
 
     response.raise_for_status()
     results = response.json()
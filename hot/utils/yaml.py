@@ -13,15 +13,24 @@ except ImportError:
     # it's available on PyPI
     from ordereddict import OrderedDict
 
+# Use the libyaml bindings when PyYAML was built with them, they parse and
+# emit many times faster than the pure Python implementation.
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+    LIBYAML = True
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+    LIBYAML = False
 
-class OrderedDictYAMLLoader(yaml.Loader):
+
+class OrderedDictYAMLLoader(SafeLoader):
     """
     A YAML loader that loads mappings into ordered dictionaries. Source:
     https://gist.github.com/enaeseth/844388
     """
 
     def __init__(self, *args, **kwargs):
-        yaml.Loader.__init__(self, *args, **kwargs)
+        SafeLoader.__init__(self, *args, **kwargs)
 
         self.add_constructor(u'tag:yaml.org,2002:map',
                              type(self).construct_yaml_map)
@@ -60,10 +69,14 @@ class OrderedDictYAMLLoader(yaml.Loader):
         return mapping
 
 
-def load(yaml_string, error_message="Error in template file:"):
-    """Return a yaml object for the provided string"""
+def load(yaml_string, error_message="Error in template file:",
+         ordered=False):
+    """Return a yaml object for the provided string. With `ordered`,
+    mappings keep the order they have in the file.
+    """
+    loader = OrderedDictYAMLLoader if ordered else SafeLoader
     try:
-        return yaml.safe_load(yaml_string)
+        return yaml.load(yaml_string, Loader=loader)
     except yaml.YAMLError, exc:
         print(error_message, exc)
         sys.exit(1)
@@ -75,7 +88,7 @@ def dump(obj, error_message="Error in template file:"):
     `obj` can be a dictionary, array, etc.
     """
     try:
-        return yaml.safe_dump(obj)
+        return yaml.dump(obj, Dumper=SafeDumper)
     except yaml.YAMLError, exc:
         print(error_message, exc)
         sys.exit(1)
@@ -0,0 +1,188 @@
+import json
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import unittest
+from argh import ArghParser
+from hot import lint
+from hot import shell
+from hot.utils import parsed
+from hot.utils import yaml
+
+TEMPLATE = """heat_template_version: 2013-05-23
+description: Test
+parameter_groups:
+- label: Server
+  parameters: [flavor]
+- parameters: [image]
+parameters:
+  flavor:
+    type: string
+    label: Flavor
+    description: Server flavor
+    constraints: []
+  image:
+    type: string
+resources: {}
+outputs:
+  ip:
+    value: 127.0.0.1
+"""
+
+
+class TestLint(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.environ = dict(os.environ)
+        os.environ.update({
+            'HOT_LINK_CACHE': os.path.join(self.directory, 'links.json'),
+            'HOT_PARSE_CACHE': os.path.join(self.directory, 'parsed.db')})
+        parsed.reset()
+        self.template_file = os.path.join(self.directory, 'template.yaml')
+        with open(self.template_file, 'w') as handle:
+            handle.write(TEMPLATE)
+        self.violations = lint.Linter().run(yaml.load(TEMPLATE),
+                                            {'abstract': 'Test'})
+        lint.locate(self.violations, {'template': self.template_file})
+
+    def tearDown(self):
+        if parsed._cache:
+            parsed._cache.close()
+        parsed.reset()
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.directory)
+
+    def found(self):
+        return [(v.rule, v.line, v.column) for v in self.violations]
+
+    def test_all_violations_reported_with_position(self):
+        self.assertEqual(self.found(), [
+            ('LINT-007', None, None),
+            ('LINT-006', 6, 3),
+            ('LINT-003', 13, 3),
+            ('LINT-004', 13, 3),
+            ('LINT-005', 13, 3),
+            ('LINT-002', 17, 3),
+        ])
+
+    def test_rules_visit_only_their_nodes(self):
+        linter = lint.Linter(['TemplateLintParameterLabelCheck'])
+        self.assertEqual(len(linter.visitors['parameter']), 1)
+        self.assertEqual(linter.visitors['output'], [])
+
+    def test_missing_sections_do_not_break_rules(self):
+        violations = lint.Linter().run({'parameters': None}, None)
+        self.assertEqual(sorted(v.rule for v in violations),
+                         ['LINT-001', 'LINT-007'])
+
+    def test_text_format(self):
+        text = lint.format_violations(self.violations)
+        self.assertIn("%s:13:3: LINT-003: " % self.template_file, text)
+        self.assertIn("`image` has no `label`.", text)
+
+    def test_json_format(self):
+        report = json.loads(lint.format_violations(self.violations, 'json'))
+        self.assertEqual(report[2]['path'], ['parameters', 'image'])
+        self.assertEqual(report[2]['file'], self.template_file)
+
+
+class TestLintAll(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        # Pool workers open their own caches from the environment
+        self.environ = dict(os.environ)
+        os.environ.update({
+            'HOT_LINK_CACHE': os.path.join(self.directory, 'links.json'),
+            'HOT_PARSE_CACHE': os.path.join(self.directory, 'cache.db')})
+        parsed.reset()
+        self.write('repo/.catalog', TEMPLATE)
+        self.write('repo/rackspace.yaml', 'abstract: Test\n')
+        self.write('repo/tests.yaml', 'test-cases: []\n')
+        self.write('repo/nested/server.yaml', TEMPLATE)
+        self.write('repo/.git/config.yaml', TEMPLATE)
+        self.write('broken/.catalog', 'parameters: [\n')
+        self.check_content = lint.check_content
+        self.checked = []
+
+        def counting(document, content, rules):
+            self.checked.append(document)
+            return self.check_content(document, content, rules)
+        lint.check_content = counting
+
+    def tearDown(self):
+        lint.check_content = self.check_content
+        if parsed._cache:
+            parsed._cache.close()
+        parsed.reset()
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as handle:
+            handle.write(content)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_discover(self):
+        self.assertEqual(lint.discover([self.directory]), [
+            (self.path('broken/.catalog'), None),
+            (self.path('repo/.catalog'), self.path('repo/rackspace.yaml')),
+            (self.path('repo/nested/server.yaml'), None),
+        ])
+
+    def test_command_line_paths(self):
+        parser = ArghParser()
+        parser.add_commands([shell.lint])
+        output = StringIO.StringIO()
+        stdout, sys.stdout = sys.stdout, output
+        try:
+            with self.assertRaises(SystemExit):
+                parser.dispatch(['lint', '--all', '--format', 'json',
+                                 '--paths', self.path('repo'),
+                                 self.path('broken')])
+        finally:
+            sys.stdout = stdout
+        found = set(os.path.relpath(violation['file'], self.directory)
+                    for violation in json.loads(output.getvalue()))
+        self.assertEqual(found, set(['broken/.catalog', 'repo/.catalog',
+                                     'repo/nested/server.yaml',
+                                     'repo/rackspace.yaml']))
+
+    def test_combined_report(self):
+        violations = lint.lint_all(lint.discover([self.directory]), 2)
+        found = [(os.path.relpath(v.file, self.directory), v.rule, v.line)
+                 for v in violations]
+        self.assertIn(('broken/.catalog', 'LINT-000', 2), found)
+        self.assertIn(('repo/.catalog', 'LINT-006', 6), found)
+        self.assertIn(('repo/nested/server.yaml', 'LINT-006', 6), found)
+        self.assertIn(('repo/rackspace.yaml', 'LINT-007', 1), found)
+
+    def test_results_cached_by_content_and_version(self):
+        template = self.path('repo/.catalog')
+        first = lint.lint_file('template', template)
+        second = lint.lint_file('template', template)
+        self.assertEqual([v.to_dict() for v in first],
+                         [v.to_dict() for v in second])
+        nested = self.path('repo/nested/server.yaml')
+        self.assertEqual(lint.lint_file('template', nested)[0].file, nested)
+        self.assertEqual(self.checked, ['template'])
+        lint.ENGINE_VERSION += 1
+        try:
+            lint.lint_file('template', template)
+        finally:
+            lint.ENGINE_VERSION -= 1
+        self.assertEqual(self.checked, ['template', 'template'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import unittest
+from hot import shell
+from hot.utils import parsed
+
+
+class TestShell(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.environ = dict(os.environ)
+        os.environ['HOT_PARSE_CACHE'] = os.path.join(self.directory,
+                                                     'parsed.db')
+        parsed.reset()
+        self.template = {'heat_template_version': '2013-05-23'}
+        self.tests = [
+            {'name': 'first', 'create': {'parameters': {'flavor': '1GB'}}},
+            {'name': 'second', 'create': {'parameters': {'flavor': '2GB'}}},
+            {'name': 'third', 'create': {'parameters': {'flavor': '1GB'},
+                                         'timeout': 30}},
+            {'name': 'fourth', 'create': {}},
+        ]
+
+    def tearDown(self):
+        if parsed._cache:
+            parsed._cache.close()
+        parsed.reset()
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.directory)
+
+    def group_names(self, groups):
+        return [[test['name'] for test in group] for group in groups]
+
+    def test_group_test_cases(self):
+        groups = shell.group_test_cases(self.template, None, self.tests)
+        self.assertEqual(self.group_names(groups),
+                         [['first', 'third'], ['second'], ['fourth']])
+
+    def test_group_test_cases_overrides(self):
+        groups = shell.group_test_cases(self.template, ['flavor=4GB'],
+                                        self.tests)
+        self.assertEqual(self.group_names(groups),
+                         [['first', 'second', 'third', 'fourth']])
+
+    def test_stack_fingerprint_template(self):
+        other = {'heat_template_version': '2014-10-16'}
+        self.assertNotEqual(
+            shell.stack_fingerprint(self.template, None, self.tests[0]),
+            shell.stack_fingerprint(other, None, self.tests[0]))
+
+    def test_chain_test_groups(self):
+        groups = [[test] for test in self.tests]
+        chains = shell.chain_test_groups(None, groups)
+        self.assertEqual([self.group_names(chain) for chain in chains],
+                         [[['first'], ['third'], ['second'], ['fourth']]])
+
+    def test_chain_test_groups_concurrency(self):
+        groups = [[test] for test in self.tests]
+        chains = shell.chain_test_groups(None, groups, 3)
+        self.assertEqual([len(chain) for chain in chains], [1, 1, 2])
+
+    def test_parameter_diff(self):
+        self.assertEqual(shell.parameter_diff({'a': 1, 'b': 2},
+                                              {'a': 1, 'c': 3}), 2)
+
+    def test_case_fingerprint_files(self):
+        directory = tempfile.mkdtemp()
+        try:
+            fabfile = os.path.join(directory, 'check.py')
+            with open(fabfile, 'w') as handle:
+                handle.write("first")
+            test = {'name': 'fab', 'create': {}, 'resource_tests': {
+                'tests': [{'server': {'fabric': {
+                    'env': {'fabfile': 'check.py'}}}}]}}
+            self.assertEqual(shell.referenced_files(test, directory),
+                             ['check.py'])
+            before = shell.case_fingerprint(self.template, None, test,
+                                            directory)
+            with open(fabfile, 'w') as handle:
+                handle.write("second")
+            self.assertNotEqual(before, shell.case_fingerprint(
+                self.template, None, test, directory))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_tests_subset_ci(self):
+        os.environ['CIRCLE_NODE_TOTAL'] = '2'
+        os.environ['CIRCLE_NODE_INDEX'] = '1'
+        try:
+            durations = {'first': 600, 'second': 300, 'third': 200,
+                         'fourth': 100}
+            selected = shell.tests_subset_ci(self.tests, durations)
+            self.assertEqual([test['name'] for test in selected],
+                             ['second', 'third', 'fourth'])
+            selected = shell.tests_subset_ci(self.tests)
+            self.assertEqual([test['name'] for test in selected],
+                             ['second', 'fourth'])
+        finally:
+            del os.environ['CIRCLE_NODE_TOTAL']
+            del os.environ['CIRCLE_NODE_INDEX']
+
+    def test_read_manifest(self):
+        directory = tempfile.mkdtemp()
+        try:
+            manifest = os.path.join(directory, 'fleet.yaml')
+            with open(manifest, 'w') as handle:
+                handle.write("repos:\n- memcached\n- ../redis\n")
+            self.assertEqual(shell.read_manifest(manifest), [
+                os.path.join(directory, 'memcached'),
+                os.path.join(directory, '../redis')])
+            with open(manifest, 'w') as handle:
+                handle.write("repos: memcached\n")
+            self.assertRaises(SystemExit, shell.read_manifest, manifest)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# Seconds `hot docs` and `hot lint` may spend importing before they start
+# working. Override with HOT_STARTUP_BUDGET on slow machines.
+STARTUP_BUDGET = float(os.environ.get('HOT_STARTUP_BUDGET', 0.5))
+RUNS = 3
+
+# Only `hot test` and `hot init` need these.
+HEAVY_MODULES = ['fabric', 'git', 'heatclient', 'keystoneclient', 'paramiko',
+                 'requests', 'retrying']
+
+MEASURE = """
+import json, sys, time
+start = time.time()
+import hot.shell
+%s
+elapsed = time.time() - start
+print(json.dumps({'elapsed': elapsed, 'loaded': sorted(
+    name for name in %r if name in sys.modules)}))
+"""
+
+
+def measure(imports=''):
+    """Import hot.shell plus `imports` in a fresh interpreter and return the
+    best time of a few runs and the heavy modules it loaded.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    for _ in range(RUNS):
+        output = subprocess.check_output(
+            [sys.executable, '-c', MEASURE % (imports, HEAVY_MODULES)],
+            cwd=root)
+        results.append(json.loads(output))
+    return min(r['elapsed'] for r in results), results[0]['loaded']
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_docs_startup(self):
+        elapsed, loaded = measure()
+        self.assertEqual(loaded, [])
+        self.assertLess(elapsed, STARTUP_BUDGET)
+
+    def test_lint_startup(self):
+        elapsed, loaded = measure('import hot.lint')
+        self.assertEqual(loaded, [])
+        self.assertLess(elapsed, STARTUP_BUDGET)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from fabric.api import env
+from hot.tests import fab
+from hot.utils import output
+
+# Check how long the parallel run took only when HOT_BENCHMARKS is set. The
+# pid files written by the task show the hosts ran in their own processes.
+BENCHMARKS = bool(os.environ.get('HOT_BENCHMARKS'))
+
+FABFILE = """import os
+import time
+from fabric.api import env, task
+
+OUT = %r
+
+
+@task
+def check():
+    time.sleep(0.5)
+    with open(os.path.join(OUT, env.host_string or 'local'), 'w') as handle:
+        handle.write(env.user)
+    with open(os.path.join(OUT, '%%s.pid' %% env.host_string), 'w') as handle:
+        handle.write(str(os.getpid()))
+"""
+
+
+class TestTestsFab(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fabfile = os.path.join(self.directory, 'fabfile.py')
+        with open(self.fabfile, 'w') as handle:
+            handle.write(FABFILE % self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_fabfile_cached_by_content(self):
+        first = fab.load_fabfile(self.fabfile)
+        self.assertIs(fab.load_fabfile(self.fabfile), first)
+        with open(self.fabfile, 'a') as handle:
+            handle.write("\nEXTRA = 1\n")
+        second = fab.load_fabfile(self.fabfile)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.EXTRA, 1)
+
+    def test_settings_scoped_to_test(self):
+        user = env.user
+        fab.run_fabric_tasks('scoped', {'fabric': {'env': {
+            'user': 'tester', 'fabfile': self.fabfile, 'tasks': ['check']}}})
+        with open(os.path.join(self.directory, 'local')) as handle:
+            self.assertEqual(handle.read(), 'tester')
+        self.assertEqual(env.user, user)
+        self.assertNotEqual(env.get('tasks'), ['check'])
+
+    def test_parallel_hosts(self):
+        hosts = ['10.0.0.%s' % i for i in range(1, 5)]
+        start = time.time()
+        fab.run_fabric_tasks('parallel', {'fabric': {'env': {
+            'user': 'root', 'hosts': hosts, 'parallel': True,
+            'pool_size': 4, 'fabfile': self.fabfile, 'tasks': ['check']}}})
+        elapsed = time.time() - start
+        print("\n  %s hosts in parallel: %.3fs" % (len(hosts), elapsed))
+        if BENCHMARKS:
+            self.assertLess(elapsed, 1.5)
+        self.assertEqual(sorted(name for name in os.listdir(self.directory)
+                                if not name.endswith('.pid')),
+                         sorted(hosts + ['fabfile.py']))
+        with open(os.path.join(self.directory, hosts[0] + '.pid')) as handle:
+            self.assertNotEqual(int(handle.read()), os.getpid())
+        self.assertFalse(env.parallel)
+
+    def test_parallel_refused_when_concurrent(self):
+        hosts = ['10.0.0.%s' % i for i in range(1, 3)]
+        pids = []
+        with output.prefixed():
+            fab.run_fabric_tasks('concurrent', {'fabric': {'env': {
+                'user': 'root', 'hosts': hosts, 'parallel': True,
+                'fabfile': self.fabfile, 'tasks': ['check']}}})
+        for host in hosts:
+            with open(os.path.join(self.directory, host + '.pid')) as handle:
+                pids.append(int(handle.read()))
+        self.assertEqual(pids, [os.getpid()] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from hot.tests import script
+from hot.utils import report
+
+
+class TestTestsScript(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def shell(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as handle:
+            handle.write(content)
+        return {'command': 'sh %s' % path}
+
+    def test_output_captured(self):
+        command = self.shell('out.sh', 'echo hello; echo oops >&2')
+        result = script.run_command(script.build_command(command))
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(sorted((stream, line)
+                                for _, stream, line in result.lines),
+                         [('stderr', 'oops'), ('stdout', 'hello')])
+
+    def test_output_not_utf8(self):
+        # An invalid byte, then a line cut in the middle of a character
+        command = self.shell('bytes.sh', "printf 'abc\\377\\nx'; "
+                                         "printf '\\303\\251%.0s' $(seq 1200)")
+        report.start()
+        with report.case('bytes') as record:
+            report.command(script.run_command(
+                script.build_command(command)).to_dict())
+        output = record.commands[0]['output']
+        self.assertEqual(output[0]['line'], u'abc\ufffd')
+        self.assertEqual(output[1]['line'],
+                         u'x' + u'\xe9' * (script.LINE_LENGTH - 1))
+        report.write(self.directory)
+
+    def test_output_bounded(self):
+        result = script.run_command([sys.executable, '-c',
+                                     'for i in range(500): print(i)'])
+        data = result.to_dict()
+        self.assertEqual(len(data['output']), script.OUTPUT_LINES)
+        self.assertEqual(data['dropped_lines'], 500 - script.OUTPUT_LINES)
+        self.assertEqual(data['output'][-1]['line'], '499')
+
+    def test_timeout_kills_process_group(self):
+        command = self.shell('hang.sh', 'sleep 30 & wait')
+        start = time.time()
+        result = script.run_command(script.build_command(command), 0.5)
+        self.assertTrue(result.timed_out)
+        self.assertLess(time.time() - start, 3)
+        self.assertIn('timed out', result.failure())
+
+    def test_serial_stops_at_first_failure(self):
+        commands = [self.shell('fail.sh', 'exit 3'),
+                    self.shell('never.sh', 'touch %s/ran' % self.directory)]
+        with self.assertRaises(script.CommandFailed):
+            script.run_commands(commands)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'ran')))
+
+    def test_parallel_commands(self):
+        commands = [self.shell('a.sh', 'sleep 0.5'),
+                    self.shell('b.sh', 'sleep 0.5'),
+                    {'command': 'no-such-command-for-hot'}]
+        report.start()
+        start = time.time()
+        with self.assertRaises(script.CommandFailed) as raised:
+            with report.case('parallel') as record:
+                script.run_commands(commands, parallel=True)
+        self.assertLess(time.time() - start, 0.9)
+        self.assertIn('could not start', str(raised.exception))
+        self.assertEqual([c['returncode'] for c in record.commands],
+                         [0, 0, None])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import unittest
+from hot.utils import auth
+
+
+class TestUtilAuth(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.environ = dict(os.environ)
+        os.environ.pop('OS_AUTH_TOKEN', None)
+        os.environ.update({'OS_USERNAME': 'user', 'OS_PASSWORD': 'secret',
+                           'OS_TENANT_ID': '123456', 'OS_REGION_NAME': 'iad',
+                           'OS_AUTH_URL': 'https://identity.example.com/v2.0',
+                           'HOT_AUTH_CACHE': os.path.join(self.directory,
+                                                          'auth.json')})
+        self.entry = {'token': 'cached-token',
+                      'expires': time.time() + 3600,
+                      'region': 'IAD',
+                      'endpoints': {'IAD': 'https://iad.example.com/v1/1'}}
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.directory)
+
+    def write_cache(self):
+        key = auth.OSAuth.__new__(auth.OSAuth)
+        key.creds = key.get_keystone_creds()
+        with open(os.environ['HOT_AUTH_CACHE'], 'w') as handle:
+            json.dump({key.get_cache_key(): self.entry}, handle)
+
+    def test_cached_token_skips_keystone(self):
+        self.write_cache()
+        os_auth = auth.OSAuth()
+        self.assertIsNone(os_auth.keystone_client)
+        self.assertEqual(os_auth.get_token(), 'cached-token')
+        self.assertEqual(os_auth.get_heat_url(),
+                         'https://iad.example.com/v1/1')
+
+    def test_save_cache_permissions(self):
+        self.write_cache()
+        os_auth = auth.OSAuth()
+        os_auth.save_cache()
+        mode = os.stat(os.environ['HOT_AUTH_CACHE']).st_mode
+        self.assertEqual(stat.S_IMODE(mode), 0o600)
+        with open(os.environ['HOT_AUTH_CACHE']) as handle:
+            self.assertNotIn('secret', handle.read())
+
+    def test_expiring_cache_is_ignored(self):
+        self.entry['expires'] = time.time() + auth.EXPIRY_MARGIN - 1
+        self.write_cache()
+        os_auth = auth.OSAuth.__new__(auth.OSAuth)
+        os_auth.creds = os_auth.get_keystone_creds()
+        os_auth.cache_path = os.environ['HOT_AUTH_CACHE']
+        os_auth.cache_key = os_auth.get_cache_key()
+        self.assertIsNone(os_auth.load_cache())
+
+    def test_failed_refresh_backs_off(self):
+        self.entry['expires'] = time.time()
+        self.write_cache()
+        os_auth = auth.OSAuth.__new__(auth.OSAuth)
+        os_auth.creds = os_auth.get_keystone_creds()
+        os_auth.entry = self.entry
+        sleeps = []
+        stop = threading.Event()
+
+        def sleep(seconds):
+            if len(sleeps) == 8:
+                # Park the refresh thread for good
+                stop.wait()
+            sleeps.append(seconds)
+
+        def get_token():
+            raise IOError("keystone is down")
+        os_auth.get_token = get_token
+        os_auth.keep_token_fresh(object(), sleep)
+        for _ in range(50):
+            if len(sleeps) == 8:
+                break
+            time.sleep(0.05)
+        self.assertEqual(sleeps, [1, 2, 4, 8, 16, 32, 60, 60])
+
+if __name__ == "__main__":
+    unittest.main()
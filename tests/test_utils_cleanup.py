@@ -0,0 +1,105 @@
+import unittest
+from hot.utils import cleanup
+
+
+class NotFound(Exception):
+    code = 404
+
+
+class FakeStack(object):
+
+    def __init__(self, status):
+        self.stack_status = status
+        self.stack_status_reason = "reason for %s" % status
+
+
+class FakeStacks(object):
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.deletes = []
+
+    def delete(self, stack_id):
+        self.deletes.append(stack_id)
+
+    def get(self, stack_id):
+        status = self.statuses[stack_id].pop(0)
+        if status is None:
+            raise NotFound()
+        if isinstance(status, Exception):
+            raise status
+        return FakeStack(status)
+
+
+class FakeHeat(object):
+
+    def __init__(self, statuses):
+        self.stacks = FakeStacks(statuses)
+
+
+class TestUtilCleanup(unittest.TestCase):
+
+    def test_reaper_waits_for_delete(self):
+        hc = FakeHeat({'a': ['CREATE_COMPLETE', 'DELETE_IN_PROGRESS',
+                             'DELETE_COMPLETE'],
+                       'b': ['DELETE_IN_PROGRESS', None]})
+        reaper = cleanup.StackReaper(hc, sleeper=0.01)
+        reaper.delete('a')
+        reaper.delete('b')
+        self.assertEqual(reaper.finish(), {})
+        self.assertEqual(sorted(hc.stacks.deletes), ['a', 'b'])
+
+    def test_reaper_times_deletes(self):
+        hc = FakeHeat({'a': ['DELETE_IN_PROGRESS', None],
+                       'b': ['DELETE_FAILED'] * 3})
+        reaper = cleanup.StackReaper(hc, sleeper=0.01)
+        timed = []
+        reaper.delete('a', timed.append)
+        reaper.delete('b', timed.append)
+        reaper.finish()
+        self.assertEqual(reaper.durations.keys(), ['a'])
+        self.assertEqual(timed, [reaper.durations['a']])
+        self.assertTrue(timed[0] > 0)
+
+    def test_reaper_retries_failed_delete(self):
+        hc = FakeHeat({'a': ['DELETE_FAILED', 'DELETE_COMPLETE']})
+        reaper = cleanup.StackReaper(hc, sleeper=0.01)
+        reaper.delete('a')
+        self.assertEqual(reaper.finish(), {})
+        self.assertEqual(hc.stacks.deletes, ['a', 'a'])
+
+    def test_reaper_reports_leftovers(self):
+        hc = FakeHeat({'a': ['DELETE_FAILED'] * 3})
+        reaper = cleanup.StackReaper(hc, sleeper=0.01)
+        reaper.delete('a')
+        self.assertEqual(reaper.finish(),
+                         {'a': 'reason for DELETE_FAILED'})
+
+    def test_reaper_retries_errors(self):
+        hc = FakeHeat({'a': [IOError("connection reset"), None]})
+        reaper = cleanup.StackReaper(hc, sleeper=0.01)
+        reaper.delete('a')
+        self.assertEqual(reaper.finish(), {})
+        self.assertEqual(hc.stacks.deletes, ['a', 'a'])
+
+    def test_reaper_gives_up_after_timeout(self):
+        hc = FakeHeat({'a': ['DELETE_IN_PROGRESS'] * 1000})
+        reaper = cleanup.StackReaper(hc, sleeper=0.01, delete_timeout=0.1)
+        reaper.delete('a')
+        self.assertEqual(reaper.finish(),
+                         {'a': 'Not deleted within 0.1 seconds'})
+        self.assertEqual(hc.stacks.deletes, ['a'])
+
+    def test_finish_reports_unfinished(self):
+        hc = FakeHeat({'a': ['DELETE_IN_PROGRESS'] * 30})
+        reaper = cleanup.StackReaper(hc, sleeper=0.01)
+        reaper.delete('a')
+        self.assertEqual(reaper.finish(0.1), {'a': 'Still being deleted'})
+
+    def test_finish_without_deletes(self):
+        reaper = cleanup.StackReaper(FakeHeat({}))
+        self.assertEqual(reaper.finish(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import sys
+import threading
+import time
+import unittest
+from StringIO import StringIO
+
+from hot.utils import executor
+from hot.utils import output
+
+
+class TestUtilExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.items = ["first", "second", "third", "fourth"]
+
+    def test_run_results_in_order(self):
+        results = executor.run(lambda item: item.upper(), self.items, 2)
+        self.assertEqual([r.value for r in results],
+                         [i.upper() for i in self.items])
+        self.assertTrue(all(r.passed for r in results))
+
+    def test_run_records_failures(self):
+        def func(item):
+            if item == "second":
+                sys.exit("exited")
+            if item == "third":
+                raise ValueError("bad value")
+        results = executor.run(func, self.items, 4)
+        self.assertEqual([r.passed for r in results],
+                         [True, False, False, True])
+        self.assertEqual(results[1].error, "exited")
+        self.assertEqual(results[2].error, "ValueError: bad value")
+
+    def test_run_bounded_concurrency(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+
+        def func(item):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.05)
+            with lock:
+                state['running'] -= 1
+        executor.run(func, self.items, 2)
+        self.assertEqual(state['peak'], 2)
+
+
+class TestUtilOutput(unittest.TestCase):
+
+    def test_prefixed_stream(self):
+        target = StringIO()
+        stream = output.PrefixedStream(target)
+        output.set_prefix("[case] ")
+        try:
+            stream.write("partial ")
+            self.assertEqual(target.getvalue(), "")
+            stream.write("line\nnext\n")
+        finally:
+            output.set_prefix("")
+        self.assertEqual(target.getvalue(), "[case] partial line\n"
+                                            "[case] next\n")
+
+    def test_softspace_per_thread(self):
+        target = StringIO()
+        stream = output.PrefixedStream(target)
+
+        def partial():
+            print >>stream, "partial",
+
+        thread = threading.Thread(target=partial)
+        thread.start()
+        thread.join()
+        print >>stream, "line"
+        self.assertEqual(target.getvalue(), "line\n")
+
+    def test_nested_prefixes(self):
+        def inner(item):
+            print(item)
+
+        target = StringIO()
+        stdout, sys.stdout = sys.stdout, target
+        try:
+            executor.run(lambda item: executor.run(inner, ['cmd']), ['case'])
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(target.getvalue(), "[case] [cmd] cmd\n")
+
+if __name__ == "__main__":
+    unittest.main()
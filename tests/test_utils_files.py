@@ -1,5 +1,8 @@
 import unittest
 import os
+import shutil
+import stat
+import tempfile
 from hot.utils import files
 
 
@@ -20,6 +23,20 @@ class TestUtilFiles(unittest.TestCase):
         self.assertRaises(TypeError, files.write_file, self.wf, self.boolean)
         os.remove(self.wf)
 
+    def test_write_private(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'cache', 'entries.json')
+            files.write_private(path, "{}")
+            files.write_private(path, "[]")
+            with open(path) as handle:
+                self.assertEqual(handle.read(), "[]")
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+            self.assertEqual(os.listdir(os.path.dirname(path)),
+                             ['entries.json'])
+        finally:
+            shutil.rmtree(directory)
+
     def test_delete_file(self):
         for f in self.lst:
             open(f, 'a').close()
@@ -28,5 +45,11 @@ class TestUtilFiles(unittest.TestCase):
     def test_delete_file_invalid(self):
         self.assertRaises(TypeError, files.delete_file, self.dictionary)
 
+    def test_working_directory(self):
+        before = os.getcwd()
+        with files.working_directory('/'):
+            self.assertEqual(os.getcwd(), '/')
+        self.assertEqual(os.getcwd(), before)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,131 @@
+import os
+import re
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+from hot.utils import hosts
+
+# Lines of the generated hosts file used for the benchmark
+HOSTS_LINES = 50000
+# Set HOT_BENCHMARKS to also require the speedup, not just print it.
+BENCHMARKS = bool(os.environ.get('HOT_BENCHMARKS'))
+
+ORIGINAL = """127.0.0.1\tlocalhost
+# comment line
+10.0.0.1\tdb db.internal  # inline comment
+::1\tlocalhost ip6-localhost
+"""
+
+
+def regex_parse(path):
+    """The previous parser, three regular expressions per line"""
+    result = {}
+    with open(path, 'r') as hosts_file:
+        for line in hosts_file.read().split('\n'):
+            if len(re.sub(r'\s*', '', line)) and not line.startswith('#'):
+                line = re.sub(r'\s+$', '', line)
+                parts = re.split(r'\s+', line)
+                for host_name in parts[1:]:
+                    result.setdefault(host_name, []).append(parts[0])
+    return result
+
+
+def best_time(func, runs=3):
+    times = []
+    for _ in range(runs):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+
+class TestUtilHosts(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'hosts')
+        with open(self.path, 'w') as handle:
+            handle.write(ORIGINAL)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self):
+        with open(self.path) as handle:
+            return handle.read()
+
+    def test_parse(self):
+        parsed = hosts.Hosts(self.path).hosts
+        self.assertEqual(parsed['localhost'], ['127.0.0.1', '::1'])
+        self.assertEqual(parsed['db.internal'], ['10.0.0.1'])
+        self.assertNotIn('#', parsed)
+        self.assertNotIn('inline', parsed)
+
+    def test_write_file_replaces_atomically(self):
+        os.chmod(self.path, 0o640)
+        inode = os.stat(self.path).st_ino
+        hosts.write_file(self.path, "1.2.3.4\texample.com\n")
+        self.assertEqual(self.read(), "1.2.3.4\texample.com\n")
+        self.assertNotEqual(os.stat(self.path).st_ino, inode)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+        self.assertEqual(os.listdir(self.directory), ['hosts'])
+
+    def test_transaction_writes_once_and_restores(self):
+        with hosts.Transaction(self.path) as transaction:
+            transaction.set_one('example.com', '1.2.3.4')
+            transaction.set_all(['db', 'db.internal'], '10.0.0.9')
+            self.assertEqual(self.read(), ORIGINAL)
+            transaction.commit()
+            parsed = hosts.Hosts(self.path).hosts
+            self.assertEqual(parsed['example.com'], ['1.2.3.4'])
+            # Added entries come first, so they win over the existing ones
+            self.assertEqual(parsed['db'], ['10.0.0.9', '10.0.0.1'])
+            with open(self.path, 'a') as handle:
+                handle.write("10.0.0.2\tother\n")
+        self.assertEqual(self.read(), ORIGINAL + "10.0.0.2\tother\n")
+
+    def test_transaction_restores_on_error(self):
+        with self.assertRaises(ValueError):
+            with hosts.Transaction(self.path) as transaction:
+                transaction.set_one('example.com', '1.2.3.4')
+                transaction.commit()
+                raise ValueError()
+        self.assertEqual(self.read(), ORIGINAL)
+
+    def test_other_transactions_left_alone(self):
+        other = "%s\n1.1.1.1\told\n%s\n" % (hosts.BEGIN_MARKER,
+                                            hosts.END_MARKER)
+        with open(self.path, 'w') as handle:
+            handle.write(other + ORIGINAL)
+        with hosts.Transaction(self.path) as first:
+            first.set_one('first', '2.2.2.2')
+            first.commit()
+            with hosts.Transaction(self.path) as second:
+                second.set_one('second', '3.3.3.3')
+                second.commit()
+                first.rollback()
+                parsed = hosts.Hosts(self.path).hosts
+                self.assertNotIn('first', parsed)
+                self.assertEqual(parsed['second'], ['3.3.3.3'])
+                self.assertEqual(parsed['old'], ['1.1.1.1'])
+        self.assertEqual(self.read(), other + ORIGINAL)
+
+    def test_parse_speedup(self):
+        with open(self.path, 'w') as handle:
+            for i in range(HOSTS_LINES):
+                handle.write("10.%s.%s.%s\thost%s host%s.example.com\n" % (
+                    i // 65536, i // 256 % 256, i % 256, i, i))
+        self.assertEqual(hosts.Hosts(self.path).hosts,
+                         regex_parse(self.path))
+        regex = best_time(lambda: regex_parse(self.path))
+        single_pass = best_time(lambda: hosts.Hosts(self.path))
+        print("\n  parse %s lines: %.3fs regex, %.3fs single pass (%.1fx)" % (
+            HOSTS_LINES, regex, single_pass, regex / single_pass))
+        if BENCHMARKS:
+            self.assertLess(single_pass * 2, regex)
+
+
+if __name__ == "__main__":
+    unittest.main()
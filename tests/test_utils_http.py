@@ -0,0 +1,57 @@
+import BaseHTTPServer
+import threading
+import unittest
+from hot.utils import http
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+
+    def do_GET(self):
+        Handler.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class TestUtilHttp(unittest.TestCase):
+
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = "http://127.0.0.1:%s/" % self.server.server_port
+        Handler.connections.clear()
+
+    def tearDown(self):
+        # Drop kept-alive connections so the server can stop
+        http.get_session().close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_session_is_shared(self):
+        self.assertIs(http.get_session(), http.get_session())
+
+    def test_connection_reused(self):
+        for _ in range(3):
+            self.assertEqual(http.get(self.url).content, 'ok')
+        self.assertEqual(len(Handler.connections), 1)
+
+    def test_configure_resets_session(self):
+        session = http.get_session()
+        http.configure(timeout=5)
+        try:
+            self.assertIsNot(session, http.get_session())
+            self.assertEqual(http.TIMEOUT, 5)
+        finally:
+            http.configure(timeout=60)
+
+
+if __name__ == "__main__":
+    unittest.main()
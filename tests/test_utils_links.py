@@ -0,0 +1,116 @@
+import BaseHTTPServer
+import os
+import shutil
+import SocketServer
+import stat
+import tempfile
+import threading
+import time
+import unittest
+from hot.utils import http
+from hot.utils import links
+
+ETAG = '"v1"'
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests = []
+
+    def do_HEAD(self):
+        Handler.requests.append((self.command, self.path,
+                                 self.headers.get('If-None-Match')))
+        if self.path.startswith('/slow'):
+            time.sleep(1)
+        if self.path == '/missing':
+            self.send_response(404)
+        elif self.path == '/nohead':
+            self.send_response(405)
+        elif self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+        else:
+            self.send_response(200)
+            self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        Handler.requests.append((self.command, self.path, None))
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class TestUtilLinks(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = "http://127.0.0.1:%s" % self.server.server_port
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'links.json')
+        self.environ = dict(os.environ)
+        os.environ.update({
+            'HOT_LINK_CACHE': self.path,
+            'HOT_PARSE_CACHE': os.path.join(self.directory, 'parsed.db')})
+        Handler.requests = []
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        http.get_session().close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def check(self, paths, ttl=60, timeout=5):
+        cache = links.LinkCache(self.path, ttl)
+        return links.check([self.url + path for path in paths], cache,
+                           timeout=timeout)
+
+    def test_reachable_urls_are_cached(self):
+        results = self.check(['/a', '/b', '/missing'])
+        self.assertEqual(results[self.url + '/a'], (True, None))
+        self.assertEqual(results[self.url + '/missing'], (False, 'HTTP 404'))
+        self.check(['/a', '/b', '/missing'])
+        self.assertEqual(sorted(request[1] for request in Handler.requests),
+                         ['/a', '/b', '/missing', '/missing'])
+
+    def test_cache_readable_only_by_user(self):
+        self.check(['/a'])
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_no_urls_leaves_cache_alone(self):
+        self.assertEqual(links.check([]), {})
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_expired_entries_are_revalidated(self):
+        self.check(['/a'], ttl=0)
+        results = self.check(['/a'], ttl=0)
+        self.assertEqual(results[self.url + '/a'], (True, None))
+        self.assertEqual(Handler.requests, [('HEAD', '/a', None),
+                                            ('HEAD', '/a', ETAG)])
+
+    def test_falls_back_to_get(self):
+        results = self.check(['/nohead'])
+        self.assertEqual(results[self.url + '/nohead'], (True, None))
+        self.assertEqual([r[0] for r in Handler.requests], ['HEAD', 'GET'])
+
+    def test_checks_run_concurrently_with_timeout(self):
+        start = time.time()
+        results = self.check(['/slow', '/slow?2', '/slow?3'], timeout=0.2)
+        self.assertLess(time.time() - start, 1)
+        self.assertFalse(any(ok for ok, _ in results.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from hot.utils import parsed
+
+
+class Parser(object):
+    """Count how often the cache falls through to parsing"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, content):
+        self.calls += 1
+        return {'lines': content.splitlines()}
+
+
+class TestUtilParsed(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = parsed.ParseCache(os.path.join(self.directory, 'p.db'))
+        self.parse = Parser()
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content, age=60):
+        """Write a file last modified `age` seconds ago"""
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as handle:
+            handle.write(content)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_unchanged_file_is_not_parsed_again(self):
+        path = self.write('a.yaml', 'one\ntwo')
+        first = self.cache.load(path, self.parse)
+        second = self.cache.load(path, self.parse)
+        self.assertEqual(first, {'lines': ['one', 'two']})
+        self.assertEqual(second, first)
+        self.assertEqual(self.parse.calls, 1)
+
+    def test_changed_file_is_parsed(self):
+        path = self.write('a.yaml', 'one')
+        self.cache.load(path, self.parse)
+        self.write('a.yaml', 'three', age=30)
+        self.assertEqual(self.cache.load(path, self.parse),
+                         {'lines': ['three']})
+        self.assertEqual(self.parse.calls, 2)
+
+    def test_touched_file_with_same_content(self):
+        path = self.write('a.yaml', 'one')
+        self.cache.load(path, self.parse)
+        self.write('a.yaml', 'one', age=0)
+        copy = self.write('b.yaml', 'one')
+        self.cache.load(path, self.parse)
+        self.cache.load(copy, self.parse)
+        self.assertEqual(self.parse.calls, 1)
+
+    def test_corrupt_entry_is_dropped(self):
+        path = self.write('a.yaml', 'one')
+        self.cache.load(path, self.parse)
+        with self.cache.db:
+            self.cache.db.execute("UPDATE parsed SET data = ?",
+                                  (sqlite3.Binary('\x80\x02}q'),))
+        self.assertEqual(self.cache.load(path, self.parse),
+                         {'lines': ['one']})
+        self.assertEqual(self.cache.load(path, self.parse),
+                         {'lines': ['one']})
+        self.assertEqual(self.parse.calls, 2)
+
+    def test_variants_are_separate(self):
+        path = self.write('a.yaml', 'one')
+        self.cache.load(path, self.parse, 'plain')
+        self.cache.load(path, self.parse, 'ordered')
+        self.assertEqual(self.parse.calls, 2)
+
+    def test_least_recently_used_evicted(self):
+        first = self.write('a.yaml', 'a' * 100)
+        second = self.write('b.yaml', 'b' * 100)
+        self.cache.load(first, self.parse)
+        self.cache.max_bytes = self.cache.size() + 50
+        self.cache.load(second, self.parse)
+        self.assertLessEqual(self.cache.size(), self.cache.max_bytes)
+        self.cache.load(second, self.parse)
+        self.cache.load(first, self.parse)
+        self.assertEqual(self.parse.calls, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+import time
+import unittest
+from hot.utils import poll
+from hot.utils import timeout
+
+
+class FakeResource(object):
+
+    def __init__(self, status):
+        self.resource_status = status
+
+
+class FakeResources(object):
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+
+    def list(self, stack_id):
+        return [FakeResource(status) for status in self.statuses]
+
+
+class FakeStack(object):
+
+    def __init__(self, stack_id, status, updated_time=None):
+        self.id = stack_id
+        self.stack_status = status
+        self.updated_time = updated_time
+
+
+class FakeStacks(object):
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.list_calls = 0
+
+    def list(self, filters=None):
+        self.list_calls += 1
+        stacks = []
+        self.listed = list(filters['id'])
+        for stack_id in filters['id']:
+            # Each listing moves a stack one step closer to done
+            status = self.statuses[stack_id].pop(0)
+            stacks.append(FakeStack(stack_id, status))
+        return stacks
+
+
+class BrokenStacks(object):
+
+    def __init__(self):
+        self.list_calls = 0
+
+    def list(self, filters=None):
+        self.list_calls += 1
+        raise IOError("heat is down")
+
+
+class FakeHeat(object):
+
+    def __init__(self, statuses=None, stacks=None):
+        self.resources = FakeResources(statuses or [])
+        self.stacks = FakeStacks(stacks or {})
+
+
+class TestUtilPoll(unittest.TestCase):
+
+    def test_backoff_grows_to_cap(self):
+        backoff = poll.Backoff(cap=15)
+        intervals = [backoff.next() for _ in range(5)]
+        self.assertEqual(intervals, [2, 4, 8, 15, 15])
+
+    def test_backoff_small_cap(self):
+        backoff = poll.Backoff(cap=1)
+        self.assertEqual([backoff.next() for _ in range(2)], [1, 1])
+
+    def test_backoff_tighten(self):
+        backoff = poll.Backoff(cap=30)
+        for _ in range(5):
+            backoff.next()
+        self.assertTrue(backoff.should_probe())
+        backoff.tighten()
+        self.assertFalse(backoff.should_probe())
+        self.assertEqual(backoff.next(), poll.NEAR_DONE_INTERVAL)
+
+    def test_should_probe_only_at_cap(self):
+        backoff = poll.Backoff(cap=30)
+        backoff.next()
+        self.assertFalse(backoff.should_probe())
+
+    def test_terminal_states(self):
+        self.assertTrue(poll.is_terminal('ROLLBACK_COMPLETE'))
+        self.assertTrue(poll.is_terminal('CREATE_FAILED'))
+        self.assertFalse(poll.is_terminal('CREATE_IN_PROGRESS'))
+        self.assertTrue(poll.is_success('CREATE_COMPLETE'))
+        self.assertFalse(poll.is_success('ROLLBACK_COMPLETE'))
+
+    def test_is_done_update(self):
+        self.assertFalse(poll.is_done('CREATE_COMPLETE', 'UPDATE'))
+        self.assertFalse(poll.is_done('UPDATE_IN_PROGRESS', 'UPDATE'))
+        self.assertTrue(poll.is_done('UPDATE_FAILED', 'UPDATE'))
+        self.assertTrue(poll.is_done('ROLLBACK_COMPLETE', 'UPDATE'))
+        self.assertTrue(poll.is_done('ROLLBACK_COMPLETE'))
+
+    def test_tracker_skips_previous_update(self):
+        tracker = poll.ActionTracker('UPDATE', '2015-01-01T00:00:00Z')
+        stale = FakeStack('a', 'UPDATE_COMPLETE', '2015-01-01T00:00:00Z')
+        self.assertFalse(tracker.done(stale))
+        self.assertFalse(tracker.done(FakeStack('a', 'UPDATE_IN_PROGRESS')))
+        self.assertTrue(tracker.done(stale))
+        tracker = poll.ActionTracker('UPDATE', '2015-01-01T00:00:00Z')
+        self.assertTrue(tracker.done(
+            FakeStack('a', 'UPDATE_COMPLETE', '2015-01-02T00:00:00Z')))
+        self.assertTrue(poll.ActionTracker().done(stale))
+
+    def test_stack_progress(self):
+        hc = FakeHeat(['CREATE_COMPLETE', 'CREATE_IN_PROGRESS',
+                       'CREATE_COMPLETE', 'INIT_COMPLETE'])
+        self.assertEqual(poll.stack_progress(hc, 'id'), 0.5)
+        self.assertEqual(poll.stack_progress(FakeHeat([]), 'id'), 0.0)
+
+    def test_stack_poller_batches_requests(self):
+        hc = FakeHeat(stacks={
+            'a': ['CREATE_IN_PROGRESS', 'CREATE_COMPLETE'],
+            'b': ['CREATE_IN_PROGRESS', 'ROLLBACK_COMPLETE'],
+            'c': ['CREATE_IN_PROGRESS', 'CREATE_IN_PROGRESS',
+                  'CREATE_COMPLETE'],
+        })
+        poller = poll.StackPoller(hc, sleeper=0.05)
+        waiters = [poller.watch(stack_id) for stack_id in 'abc']
+        statuses = [waiter.wait().stack_status for waiter in waiters]
+        self.assertEqual(statuses, ['CREATE_COMPLETE', 'ROLLBACK_COMPLETE',
+                                    'CREATE_COMPLETE'])
+        self.assertTrue(hc.stacks.list_calls <= 3)
+
+    def test_stack_poller_shares_ticks(self):
+        polls = 6
+        hc = FakeHeat(stacks=dict(
+            (stack_id, ['CREATE_IN_PROGRESS'] * (polls - 1) +
+             ['CREATE_COMPLETE']) for stack_id in 'abcd'))
+        poller = poll.StackPoller(hc, sleeper=0.1)
+        waiters = []
+        for stack_id in 'abcd':
+            waiters.append(poller.watch(stack_id))
+            time.sleep(0.07)
+        for waiter in waiters:
+            waiter.wait()
+        # Later stacks join the ticks of the earlier ones instead of adding
+        # requests of their own
+        self.assertTrue(hc.stacks.list_calls <= polls + 3)
+
+    def test_align(self):
+        self.assertEqual(poll.align(100.5, 2, 100), 102)
+        self.assertEqual(poll.align(102, 2, 100), 102)
+        self.assertEqual(poll.align(100.3 + 0.1 * 3, 0.1, 100.3),
+                         100.3 + 0.1 * 3)
+
+    def test_stack_poller_checks_due_stacks(self):
+        hc = FakeHeat(stacks={'a': ['CREATE_COMPLETE'],
+                              'b': ['CREATE_COMPLETE']})
+        poller = poll.StackPoller(hc, sleeper=0.05)
+        due, later = poll.StackWaiter('a', 0.05), poll.StackWaiter('b', 0.05)
+        due.due, later.due = 0, later.due + 60
+        poller.waiters = {'a': due, 'b': later}
+        poller.tick()
+        self.assertEqual(hc.stacks.listed, ['a'])
+        self.assertTrue(due.done.is_set())
+        self.assertFalse(later.done.is_set())
+
+    def test_stack_poller_waits_for_update(self):
+        hc = FakeHeat(stacks={'a': ['UPDATE_COMPLETE', 'UPDATE_IN_PROGRESS',
+                                    'UPDATE_COMPLETE']})
+        poller = poll.StackPoller(hc, sleeper=0.05)
+        poller.watch('a', action='UPDATE').wait()
+        self.assertEqual(hc.stacks.list_calls, 3)
+
+    def test_stack_poller_deadline(self):
+        hc = FakeHeat(stacks={'a': ['CREATE_IN_PROGRESS'] * 100})
+        poller = poll.StackPoller(hc, sleeper=0.05)
+        waiter = poller.watch('a', timeout.Deadline(0.1))
+        self.assertRaises(Exception, waiter.wait)
+
+    def test_stack_poller_gives_up_on_failed_lists(self):
+        hc = FakeHeat()
+        hc.stacks = BrokenStacks()
+        poller = poll.StackPoller(hc, sleeper=0.05)
+        waiter = poller.watch('a')
+        self.assertRaises(IOError, waiter.wait)
+        self.assertEqual(hc.stacks.list_calls, poll.MAX_TICK_FAILURES)
+
+    def test_stack_poller_deadline_without_status(self):
+        hc = FakeHeat()
+        hc.stacks = BrokenStacks()
+        poller = poll.StackPoller(hc, sleeper=10)
+        waiter = poller.watch('a', timeout.Deadline(0.1))
+        self.assertRaisesRegexp(Exception, 'timed out', waiter.wait)
+        self.assertTrue(hc.stacks.list_calls < poll.MAX_TICK_FAILURES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from xml.etree import ElementTree
+from hot.utils import report
+
+
+class TestUtilReport(unittest.TestCase):
+
+    def setUp(self):
+        self.run = report.start()
+
+    def test_case_passes(self):
+        with report.case('first', 'repo'):
+            with report.phase('create_request'):
+                pass
+        record = self.run.cases[0]
+        self.assertTrue(record.passed)
+        self.assertEqual(record.suite, 'repo')
+        self.assertEqual([name for name, _ in record.phases],
+                         ['create_request'])
+
+    def test_case_fails_on_exit(self):
+        with self.assertRaises(SystemExit):
+            with report.case('broken'):
+                raise SystemExit("Stack failed to deploy")
+        record = self.run.cases[0]
+        self.assertFalse(record.passed)
+        self.assertEqual(record.failure, "Stack failed to deploy")
+
+    def test_phases_belong_to_their_thread(self):
+        with report.phase('auth'):
+            pass
+
+        def work(name):
+            with report.case(name):
+                with report.phase(name + '_phase'):
+                    pass
+
+        threads = [threading.Thread(target=work, args=(name,))
+                   for name in ('a', 'b')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([name for name, _ in self.run.phases], ['auth'])
+        for record in self.run.cases:
+            self.assertEqual(record.phases[0][0], record.name + '_phase')
+
+    def test_phase_added_from_other_thread(self):
+        with report.case('first') as record:
+            self.assertIs(report.current_case(), record)
+        thread = threading.Thread(target=report.add_phase,
+                                  args=('delete', 2.5, record))
+        thread.start()
+        thread.join()
+        self.assertIsNone(report.current_case())
+        self.assertEqual(record.phases, [('delete', 2.5)])
+
+    def test_write(self):
+        with report.case('good'):
+            with report.phase('delete'):
+                pass
+        try:
+            with report.case('bad'):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+        directory = tempfile.mkdtemp()
+        try:
+            json_path, junit_path = report.write(
+                os.path.join(directory, 'artifacts'))
+            with open(json_path) as handle:
+                data = json.load(handle)
+            self.assertEqual([c['name'] for c in data['cases']],
+                             ['good', 'bad'])
+            self.assertEqual(data['cases'][0]['phases'][0]['phase'], 'delete')
+            suite = ElementTree.parse(junit_path).getroot()
+            self.assertEqual(suite.get('tests'), '2')
+            self.assertEqual(suite.get('failures'), '1')
+            failure = suite.findall('testcase')[1].find('failure')
+            self.assertEqual(failure.get('message'), "ValueError: boom")
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
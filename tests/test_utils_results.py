@@ -0,0 +1,33 @@
+import os
+import shutil
+import tempfile
+import unittest
+from hot.utils import results
+
+
+class TestUtilResults(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, '.hot', 'results.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_record_and_passed(self):
+        cache = results.ResultCache(self.path)
+        self.assertFalse(cache.passed("key"))
+        cache.record("key", "Default Build Test")
+        self.assertTrue(cache.passed("key"))
+        cache.record("key", "Default Build Test", passed=False)
+        self.assertFalse(cache.passed("key"))
+        cache.close()
+
+    def test_results_persist(self):
+        cache = results.ResultCache(self.path)
+        cache.record("key", "Default Build Test")
+        cache.close()
+        self.assertTrue(results.ResultCache(self.path).passed("key"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+import unittest
+from hot.utils import shard
+
+
+class TestUtilShard(unittest.TestCase):
+
+    def test_round_robin_without_history(self):
+        self.assertEqual(shard.shard(['a', 'b', 'c', 'd', 'e'], {}, 2),
+                         [['a', 'c', 'e'], ['b', 'd']])
+
+    def test_longest_shard_minimized(self):
+        durations = {'a': 45, 'b': 5, 'c': 5, 'd': 30, 'e': 10, 'f': 5}
+        shards = shard.shard(sorted(durations), durations, 2)
+        loads = [sum(durations[name] for name in names) for names in shards]
+        self.assertEqual(sorted(loads), [50, 50])
+        self.assertEqual(sorted(sum(shards, [])), sorted(durations))
+
+    def test_unknown_cases_use_average(self):
+        durations = {'a': 40, 'b': 20}
+        shards = shard.shard(['a', 'b', 'new'], durations, 2)
+        self.assertEqual(shards, [['a'], ['new', 'b']])
+
+    def test_timings_recorded_and_saved(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, '.hot', 'timings.json')
+            timings = shard.Timings(path)
+            timings.record('a', 100)
+            timings.record('a', 200)
+            timings.save()
+            self.assertEqual(shard.Timings(path).get('a'), 150)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
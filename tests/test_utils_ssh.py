@@ -0,0 +1,99 @@
+import threading
+import unittest
+from fabric.api import settings
+from fabric.state import connections
+from hot.utils import ssh
+
+HOST = 'root@10.0.0.1:22'
+
+
+class FakeClient(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def connect():
+    """Stand in for fabric connecting on the first remote operation"""
+    if HOST not in connections:
+        dict.__setitem__(connections, HOST, FakeClient())
+    return dict.get(connections, HOST)
+
+
+class TestUtilSsh(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = ssh.Connections()
+
+    def tearDown(self):
+        dict.pop(connections, HOST, None)
+        ssh.close_all()
+
+    def test_connection_reused_until_closed(self):
+        with settings(host_string=HOST, key_filename='key'):
+            with self.manager.channel():
+                first = connect()
+            with self.manager.channel():
+                self.assertIs(connect(), first)
+        self.manager.close()
+        self.assertTrue(first.closed)
+        self.assertNotIn(HOST, connections)
+
+    def test_stale_connection_replaced(self):
+        stale = connect()
+        with settings(host_string=HOST, key_filename='key'):
+            with self.manager.channel():
+                self.assertTrue(stale.closed)
+                first = connect()
+        with settings(host_string=HOST, key_filename='other-key'):
+            with self.manager.channel():
+                self.assertTrue(first.closed)
+                self.assertIsNot(connect(), first)
+
+    def test_channels_limited(self):
+        manager = ssh.Connections(max_channels=1)
+        inside = threading.Event()
+        release = threading.Event()
+        entered = []
+
+        def work():
+            with settings(host_string=HOST):
+                with manager.channel():
+                    entered.append(1)
+                    inside.set()
+                    release.wait(5)
+
+        threads = [threading.Thread(target=work) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        inside.wait(5)
+        self.assertEqual(len(entered), 1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(entered), 2)
+
+    def test_nested_channels_do_not_block(self):
+        manager = ssh.Connections(max_channels=1)
+        with settings(host_string=HOST):
+            with manager.channel():
+                with manager.channel():
+                    connect()
+
+    def test_managers_per_stack(self):
+        with ssh.using('stack-1') as manager:
+            self.assertIs(ssh.current(), manager)
+        self.assertIsNot(ssh.current(), manager)
+        with settings(host_string=HOST):
+            with manager.channel():
+                client = connect()
+        ssh.close('stack-1')
+        self.assertTrue(client.closed)
+        self.assertIsNot(ssh.for_stack('stack-1'), manager)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,8 @@
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
 import unittest
 from hot.utils import test
 
@@ -17,6 +22,66 @@ class TestUtilTest(unittest.TestCase):
         string = "NotThere"
         self.assertFalse(test.local_http_check(url, string))
 
+    def test_glob_quote(self):
+        self.assertEqual(test.glob_quote("/tmp/a b/*.log"),
+                         "'/tmp/a b/'*.log")
+
+
+class TestArtifacts(unittest.TestCase):
+
+    def setUp(self):
+        self.remote = tempfile.mkdtemp()
+        self.local = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.remote, 'chef', 'run 1'))
+        for name in ('cloud-init.log', 'chef/run 1/a.log',
+                     'chef/run 1/b.log'):
+            with open(os.path.join(self.remote, name), 'w') as handle:
+                handle.write(name)
+
+    def tearDown(self):
+        shutil.rmtree(self.remote)
+        shutil.rmtree(self.local)
+
+    def archive(self, artifacts):
+        """Run the archive command locally, as a remote host would"""
+        process = subprocess.Popen(test.archive_command(artifacts),
+                                   shell=True, cwd=self.remote,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        test.extract_artifacts(process.stdout, self.local)
+        errors = process.stderr.read()
+        process.wait()
+        return errors.splitlines()
+
+    def test_artifacts_streamed_as_one_archive(self):
+        errors = self.archive([os.path.join(self.remote, 'chef/*/*.log'),
+                               'cloud-init.log', '/no/such/file.log'])
+        self.assertEqual(errors, [test.MISSING + '/no/such/file.log'])
+        base = os.path.join(self.local, self.remote.lstrip('/'))
+        self.assertEqual(sorted(os.listdir(os.path.join(base, 'chef',
+                                                        'run 1'))),
+                         ['a.log', 'b.log'])
+        with open(os.path.join(base, 'cloud-init.log')) as handle:
+            self.assertEqual(handle.read(), 'cloud-init.log')
+
+    def test_nothing_found(self):
+        errors = self.archive(['/no/such/*.log'])
+        self.assertEqual(errors, [test.MISSING + '/no/such/*.log'])
+        self.assertEqual(os.listdir(self.local), [])
+
+    def test_unsafe_members_skipped(self):
+        path = os.path.join(self.remote, 'evil.tar.gz')
+        with tarfile.open(path, 'w:gz') as archive:
+            archive.add(os.path.join(self.remote, 'cloud-init.log'),
+                        '../escaped.log')
+            archive.add(os.path.join(self.remote, 'cloud-init.log'),
+                        'ok.log')
+        with open(path, 'rb') as stream:
+            test.extract_artifacts(stream, os.path.join(self.local, 'host'))
+        self.assertEqual(os.listdir(self.local), ['host'])
+        self.assertEqual(os.listdir(os.path.join(self.local, 'host')),
+                         ['ok.log'])
+
 
 if __name__ == "__main__":
     unittest.main()
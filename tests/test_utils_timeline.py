@@ -0,0 +1,86 @@
+import unittest
+from hot.utils import timeline
+
+TEMPLATE = {
+    'resources': {
+        'net': {'type': 'OS::Neutron::Net'},
+        'volume': {'type': 'OS::Cinder::Volume'},
+        'server': {
+            'type': 'OS::Nova::Server',
+            'depends_on': 'volume',
+            'properties': {
+                'networks': [{'network': {'get_resource': 'net'}}],
+            },
+        },
+        'lb': {
+            'type': 'Rackspace::Cloud::LoadBalancer',
+            'properties': {
+                'nodes': [{'addresses': [
+                    {'get_attr': ['server', 'accessIPv4']}]}],
+            },
+        },
+    },
+}
+
+
+class Event(object):
+
+    def __init__(self, resource_name, resource_status, event_time):
+        self.resource_name = resource_name
+        self.resource_status = resource_status
+        self.event_time = event_time
+
+
+def events():
+    return [
+        Event('stack', 'CREATE_IN_PROGRESS', '2015-03-11T18:00:00Z'),
+        Event('net', 'CREATE_IN_PROGRESS', '2015-03-11T18:00:00Z'),
+        Event('volume', 'CREATE_IN_PROGRESS', '2015-03-11T18:00:01Z'),
+        Event('net', 'CREATE_COMPLETE', '2015-03-11T18:00:10Z'),
+        Event('volume', 'CREATE_COMPLETE', '2015-03-11T18:01:01Z'),
+        Event('server', 'CREATE_IN_PROGRESS', '2015-03-11T18:01:02Z'),
+        Event('server', 'CREATE_COMPLETE', '2015-03-11T18:11:02Z'),
+        Event('lb', 'CREATE_IN_PROGRESS', '2015-03-11T18:11:03Z'),
+        Event('lb', 'CREATE_COMPLETE', '2015-03-11T18:13:03Z'),
+        Event('stack', 'CREATE_COMPLETE', '2015-03-11T18:13:04Z'),
+    ]
+
+
+class TestUtilTimeline(unittest.TestCase):
+
+    def test_parse_time(self):
+        self.assertEqual(timeline.parse_time('2015-03-11T18:51:22Z'),
+                         timeline.parse_time('2015-03-11 18:51:22.123+00:00'))
+
+    def test_dependencies(self):
+        graph = timeline.dependencies(TEMPLATE)
+        self.assertEqual(graph['server'], set(['net', 'volume']))
+        self.assertEqual(graph['lb'], set(['server']))
+        self.assertEqual(graph['net'], set())
+
+    def test_intervals(self):
+        spans = timeline.intervals(events(), TEMPLATE['resources'])
+        self.assertNotIn('stack', spans)
+        self.assertEqual(spans['volume'], (1, 61, 'CREATE_COMPLETE'))
+        self.assertEqual(spans['lb'], (663, 783, 'CREATE_COMPLETE'))
+
+    def test_unfinished_resources(self):
+        spans = timeline.intervals(events()[:6], TEMPLATE['resources'])
+        self.assertEqual(spans['server'], (62, None, 'CREATE_IN_PROGRESS'))
+        self.assertNotIn('server', dict(timeline.slowest(spans)))
+
+    def test_critical_path(self):
+        graph = timeline.dependencies(TEMPLATE)
+        spans = timeline.intervals(events(), graph)
+        self.assertEqual(timeline.critical_path(spans, graph),
+                         ['volume', 'server', 'lb'])
+        self.assertEqual(timeline.slowest(spans, 2),
+                         [('server', 600), ('lb', 120)])
+
+    def test_summary_without_events(self):
+        self.assertEqual(timeline.summary([], TEMPLATE),
+                         ["No create events found."])
+
+
+if __name__ == "__main__":
+    unittest.main()
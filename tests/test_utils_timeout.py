@@ -0,0 +1,24 @@
+import unittest
+from hot.utils import timeout
+
+
+class TestUtilTimeout(unittest.TestCase):
+
+    def test_no_deadline(self):
+        deadline = timeout.Deadline()
+        self.assertEqual(deadline.remaining(), float('inf'))
+        self.assertIsNone(deadline.check())
+
+    def test_deadline_remaining(self):
+        deadline = timeout.Deadline(60)
+        self.assertTrue(0 < deadline.remaining() <= 60)
+        self.assertFalse(deadline.expired())
+
+    def test_deadline_expired(self):
+        deadline = timeout.Deadline(60)
+        deadline.expires -= 61
+        self.assertTrue(deadline.expired())
+        self.assertRaises(Exception, deadline.check)
+
+if __name__ == "__main__":
+    unittest.main()
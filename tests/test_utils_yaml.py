@@ -0,0 +1,101 @@
+import os
+import time
+import unittest
+
+import yaml
+
+from collections import OrderedDict
+from hot.utils import yaml as hot_yaml
+
+# Size of the generated template used for the benchmark
+RESOURCES = 1000
+PARAMETERS = 1000
+# Timing ratios are only asserted with HOT_BENCHMARKS set, so a loaded CI
+# machine does not fail the suite. The timings are printed either way.
+BENCHMARKS = bool(os.environ.get('HOT_BENCHMARKS'))
+
+
+def large_template():
+    """Generate a template with many parameters and resources"""
+    template = {
+        'heat_template_version': '2013-05-23',
+        'description': 'Generated template',
+        'parameters': {},
+        'resources': {},
+        'outputs': {},
+    }
+    for i in range(PARAMETERS):
+        template['parameters']['param_%s' % i] = {
+            'type': 'string',
+            'default': 'value %s' % i,
+            'label': 'Parameter %s' % i,
+            'description': 'Generated parameter number %s' % i,
+            'constraints': [{'allowed_values': ['a', 'b', 'c']}],
+        }
+    for i in range(RESOURCES):
+        template['resources']['server_%s' % i] = {
+            'type': 'OS::Nova::Server',
+            'depends_on': ['server_%s' % (i - 1)] if i else [],
+            'properties': {
+                'name': {'get_param': 'param_%s' % (i % PARAMETERS)},
+                'flavor': '1 GB Performance',
+                'metadata': {'index': i, 'enabled': True},
+            },
+        }
+        template['outputs']['ip_%s' % i] = {
+            'value': {'get_attr': ['server_%s' % i, 'accessIPv4']},
+        }
+    return template
+
+
+def best_time(func, runs=2):
+    times = []
+    for _ in range(runs):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+
+class TestUtilYaml(unittest.TestCase):
+
+    def test_load(self):
+        self.assertEqual(hot_yaml.load("a: 1\nb: [x, y]\n"),
+                         {'a': 1, 'b': ['x', 'y']})
+
+    def test_load_ordered(self):
+        data = hot_yaml.load("z: 1\na: {y: 2, b: 3}\nm: 4\n", ordered=True)
+        self.assertIsInstance(data, OrderedDict)
+        self.assertEqual(list(data.keys()), ['z', 'a', 'm'])
+        self.assertEqual(list(data['a'].keys()), ['y', 'b'])
+
+    def test_load_is_safe(self):
+        with self.assertRaises(SystemExit):
+            hot_yaml.load("!!python/object/apply:os.getcwd []")
+
+    def test_dump_round_trip(self):
+        template = {'resources': {'server': {'type': 'OS::Nova::Server',
+                                             'depends_on': ['a', 'b']}}}
+        self.assertEqual(hot_yaml.load(hot_yaml.dump(template)), template)
+
+    @unittest.skipUnless(hot_yaml.LIBYAML, "PyYAML built without libyaml")
+    def test_libyaml_speedup(self):
+        template = large_template()
+        text = yaml.safe_dump(template)
+        self.assertEqual(hot_yaml.load(text), template)
+        self.assertEqual(yaml.safe_load(hot_yaml.dump(template)), template)
+        pure_load = best_time(lambda: yaml.safe_load(text))
+        fast_load = best_time(lambda: hot_yaml.load(text))
+        pure_dump = best_time(lambda: yaml.safe_dump(template))
+        fast_dump = best_time(lambda: hot_yaml.dump(template))
+        print("\n  load: %.3fs pure, %.3fs libyaml (%.1fx)" % (
+            pure_load, fast_load, pure_load / fast_load))
+        print("  dump: %.3fs pure, %.3fs libyaml (%.1fx)" % (
+            pure_dump, fast_dump, pure_dump / fast_dump))
+        if BENCHMARKS:
+            self.assertLess(fast_load * 2, pure_load)
+            self.assertLess(fast_dump * 2, pure_dump)
+
+
+if __name__ == "__main__":
+    unittest.main()